@@ -1,47 +1,116 @@
-from flask import Flask, render_template, send_from_directory, jsonify, request
+from flask import Flask, Response, g, render_template, send_from_directory, jsonify, request, stream_with_context
+import gc
+import gzip
 import os
 import json
-import random
-import math
-from enum import Enum
+import threading
+import time
+from collections import OrderedDict
+from engine import GameEngine, GRID_WIDTH, GRID_HEIGHT, PATH_REGISTRY, PATH_GRID, CELL_CHARS
+from entities import DEFAULT_TARGETING
+from metrics import METRICS_ENABLED, SIZE_BUCKETS, GcMonitor, MetricsRegistry, instrument_engine, timed
+from protocol import BINARY_MIMETYPE, snapshot_state, build_frame, encode_binary_frame
+from sessions import SessionManager
+from ticker import GameTicker
 
 app = Flask(__name__)
 
-# 游戏常量
-GRID_SIZE = 30
-GRID_WIDTH = 35
-GRID_HEIGHT = 18
-CANVAS_WIDTH = GRID_WIDTH * GRID_SIZE
-CANVAS_HEIGHT = GRID_HEIGHT * GRID_SIZE
-
-class EnemyType(Enum):
-    NORMAL = 1    # 普通敌人：基础属性
-    FAST = 2      # 快速敌人：移动速度快
-    TANK = 3      # 坦克敌人：生命值高
-    BOSS = 4      # Boss敌人：全属性高
-    FLYING = 5    # 飞行敌人：无视地形
-    STEALTH = 6   # 隐身敌人：周期性隐身
-    HEALER = 7    # 治疗者：治疗其他敌人
-    SWARM = 8     # 集群敌人：数量多
-
-# 游戏状态
-game_state = {
-    'towers': [],
-    'enemies': [],
-    'current_wave': 0,
-    'lives': 30,
-    'money': 300,
-    'score': 0,
-    'is_running': False,
-    'selected_tower': None,
-    'wave_timer': 0,
-    'wave_interval': 200,
-    'enemy_spawn_timer': 0,
-    'enemy_spawn_interval': 12,
-    'current_wave_enemies': 0,
-    'wave_enemies_count': 0,
-    'enemy_types': []
-}
+# 服务器端模拟频率（每秒帧数），为 0 时退回由客户端请求驱动模拟
+SERVER_TICK_RATE = float(os.environ.get('TOWER_DEFENSE_TICK_RATE', 60))
+MAX_CATCH_UP_TICKS = 5      # 落后时每轮最多补的帧数
+# 每帧模拟的时间预算（秒），超出时推迟部分塔的目标搜索；为 0 时不限制
+TICK_BUDGET = float(os.environ.get('TOWER_DEFENSE_TICK_BUDGET', 0.008))
+
+# 游戏会话：同时存在的会话数量上限和空闲淘汰时间（秒）
+MAX_SESSIONS = int(os.environ.get('TOWER_DEFENSE_MAX_SESSIONS', 500))
+SESSION_IDLE_TIMEOUT = float(os.environ.get('TOWER_DEFENSE_SESSION_IDLE_TIMEOUT', 600))
+
+# 增量同步：历史帧、客户端确认帧号和事件流
+FRAME_HISTORY_SIZE = 4      # 服务器为轮询客户端保留的已发送帧数量，客户端确认的帧超出此范围时发送关键帧
+MAX_TRACKED_CLIENTS = 256   # 记录确认帧号的客户端数量上限
+STREAM_KEEPALIVE = 15       # 事件流没有新帧时发送心跳的间隔（秒）
+
+# 快进：每个请求最多推进的帧数和占用的CPU时间（秒），超出时提前返回
+MAX_ADVANCE_TICKS = int(os.environ.get('TOWER_DEFENSE_MAX_ADVANCE_TICKS', 36000))
+ADVANCE_TIME_BUDGET = float(os.environ.get('TOWER_DEFENSE_ADVANCE_TIME_BUDGET', 0.05))
+
+# 响应压缩：gzip 压缩级别（0 不压缩）和需要压缩的最小响应大小（字节），只在客户端接受 gzip 时使用
+COMPRESSION_LEVEL = int(os.environ.get('TOWER_DEFENSE_COMPRESSION_LEVEL', 0))
+COMPRESSION_MIN_BYTES = int(os.environ.get('TOWER_DEFENSE_COMPRESSION_MIN_BYTES', 1024))
+
+# 启动后冻结已有对象，由 TOWER_DEFENSE_GC_FREEZE=0 关闭
+GC_FREEZE = os.environ.get('TOWER_DEFENSE_GC_FREEZE', '1') != '0'
+
+# 运行时指标，由 TOWER_DEFENSE_METRICS=0 关闭
+metrics = MetricsRegistry()
+# 垃圾回收的次数和停顿时间，同样只在启用指标时统计
+gc_monitor = GcMonitor() if METRICS_ENABLED else None
+if gc_monitor is not None:
+    metrics.add_collector(gc_monitor.collect)
+
+class GameSession:
+    # 单个游戏会话：独立的游戏引擎、帧历史和模拟循环
+    # 模拟线程和请求线程通过 lock 互斥访问
+    def __init__(self, game_id, seed=None):
+        self.id = game_id
+        self.lock = threading.RLock()
+        self.engine = GameEngine(seed=seed, tick_budget=TICK_BUDGET)
+        self.state = self.engine.state
+        if METRICS_ENABLED:
+            instrument_engine(self.engine, metrics, gc_monitor)
+        # 最近发给轮询客户端的若干帧的快照（帧号 -> 快照）以及每个客户端最后确认的帧号
+        self.frame_history = OrderedDict()
+        self.client_acks = OrderedDict()
+        # 最近一次生成的快照，同一帧的其他请求和事件流直接复用
+        self.latest_frame = None
+        self.ticker = None
+        self.last_access = time.monotonic()
+        self.closed = False
+        # 每记录一帧通知一次，事件流据此推送新帧
+        self.frame_ready = threading.Condition(self.lock)
+        # 上一次导出指标时的 (时间, 帧号)，用于计算每个游戏的帧率
+        self.metrics_sample = (self.last_access, 0)
+
+    def start(self):
+        if SERVER_TICK_RATE > 0:
+            self.ticker = GameTicker(lambda: advance_tick(self), self.lock,
+                                     SERVER_TICK_RATE, MAX_CATCH_UP_TICKS)
+            self.ticker.start()
+
+    def ticker_running(self):
+        return self.ticker is not None and self.ticker.is_alive()
+
+    def close(self):
+        if self.ticker is not None:
+            self.ticker.stop()
+        with self.lock:
+            self.closed = True
+            self.frame_ready.notify_all()
+
+sessions = SessionManager(GameSession, MAX_SESSIONS, SESSION_IDLE_TIMEOUT)
+
+def request_data():
+    # 请求体应为 JSON 对象，其他内容按空对象处理
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+def find_session(data=None):
+    game_id = request.args.get('game_id')
+    if game_id is None and data:
+        game_id = data.get('game_id')
+    return sessions.get(game_id) if game_id and isinstance(game_id, str) else None
+
+SESSION_NOT_FOUND = {'status': 'error', 'message': '游戏不存在'}
+
+def wants_binary():
+    # 客户端通过 Accept 头或 format=binary 参数请求二进制帧；错误响应始终为 JSON
+    return (request.args.get('format') == 'binary'
+            or BINARY_MIMETYPE in request.accept_mimetypes.values())
+
+def frame_response(frame):
+    if isinstance(frame, bytes):
+        return Response(frame, mimetype=BINARY_MIMETYPE)
+    return jsonify(frame)
 
 @app.route('/')
 def index():
@@ -49,377 +118,289 @@ def index():
 
 @app.route('/game_state')
 def get_game_state():
-    return jsonify(game_state)
+    game = find_session()
+    if game is None:
+        return SESSION_NOT_FOUND
+    encode = encode_binary_frame if wants_binary() else build_frame
+    with game.lock:
+        frame = encode(None, current_frame(game))
+    return frame_response(frame)
 
 @app.route('/start_game')
 def start_game():
     try:
-        game_state['is_running'] = True
-        game_state['selected_tower'] = 'ARROW'
-        game_state['current_wave'] = 0
-        game_state['lives'] = 30
-        game_state['money'] = 300
-        game_state['score'] = 0
-        game_state['towers'] = []
-        game_state['enemies'] = []
-        game_state['wave_timer'] = 0
-        game_state['enemy_spawn_timer'] = 0
-        game_state['current_wave_enemies'] = 0
-        game_state['wave_enemies_count'] = 0
-        return {'status': 'success', 'message': '游戏已启动'}
+        # 可以指定随机种子开始一局可重现的游戏
+        game = sessions.create(seed=request.args.get('seed', type=int))
+        game.start()
+        return {'status': 'success', 'message': '游戏已启动', 'game_id': game.id,
+                'seed': game.engine.seed, 'tick_rate': SERVER_TICK_RATE}
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
 
 @app.route('/place_tower', methods=['POST'])
 def place_tower():
-    data = request.get_json()
+    data = request_data()
     tower_type = data.get('type')
     x = data.get('x')
     y = data.get('y')
+    strategy = data.get('strategy', DEFAULT_TARGETING)
     
-    # 检查位置是否有效
-    if not is_valid_position(x, y):
-        return {'status': 'error', 'message': '无效的位置'}
-    
-    # 检查金钱是否足够
-    cost = get_tower_cost(tower_type)
-    if game_state['money'] < cost:
-        return {'status': 'error', 'message': '金钱不足'}
-    
-    # 添加塔
-    game_state['towers'].append({
-        'type': tower_type,
-        'x': x,
-        'y': y,
-        'level': 1,
-        'target': None,
-        'cooldown': 0,
-        'damage': get_tower_damage(tower_type),
-        'attack_speed': get_tower_attack_speed(tower_type),
-        'range': get_tower_range(tower_type)
-    })
-    game_state['money'] -= cost
-    
-    return {'status': 'success', 'message': '塔已放置'}
+    game = find_session(data)
+    if game is None:
+        return SESSION_NOT_FOUND
+    with game.lock:
+        return game.engine.place_tower(tower_type, x, y, strategy)
+
+@app.route('/set_targeting', methods=['POST'])
+def set_targeting():
+    # 修改已放置的塔的攻击策略：nearest、first、last、strongest、weakest
+    data = request_data()
+    game = find_session(data)
+    if game is None:
+        return SESSION_NOT_FOUND
+    with game.lock:
+        return game.engine.set_targeting(data.get('tower_id'), data.get('strategy'))
 
 @app.route('/update_game', methods=['POST'])
 def update_game():
-    if not game_state['is_running']:
-        return jsonify({'status': 'error', 'message': '游戏未开始'})
-    
-    # 更新波次计时器
-    game_state['wave_timer'] += 1
-    game_state['enemy_spawn_timer'] += 1
-    
-    # 检查是否需要开始新的波次
-    if game_state['wave_timer'] >= game_state['wave_interval'] and not game_state['enemies']:
-        start_new_wave()
-        game_state['wave_timer'] = 0
-    
-    # 在当前波次中生成敌人
-    if (game_state['current_wave_enemies'] < game_state['wave_enemies_count'] and 
-        game_state['enemy_spawn_timer'] >= game_state['enemy_spawn_interval']):
-        spawn_enemy()
-        game_state['enemy_spawn_timer'] = 0
-    
-    # 更新敌人位置和状态
-    update_enemies()
-    
-    # 更新塔的攻击
-    update_towers()
-    
-    return jsonify(game_state)
-
-def start_new_wave():
-    game_state['current_wave'] += 1
-    
-    # 根据波数设置敌人数量和类型
-    if game_state['current_wave'] <= 5:
-        game_state['wave_enemies_count'] = 10 + game_state['current_wave']
-        game_state['enemy_types'] = ['NORMAL', 'FAST']
-    elif game_state['current_wave'] <= 10:
-        game_state['wave_enemies_count'] = 12 + game_state['current_wave']
-        game_state['enemy_types'] = ['NORMAL', 'FAST', 'FLYING', 'TANK']
-    elif game_state['current_wave'] <= 15:
-        game_state['wave_enemies_count'] = 15 + game_state['current_wave']
-        game_state['enemy_types'] = ['NORMAL', 'FAST', 'FLYING', 'TANK', 'STEALTH', 'HEALER']
-    elif game_state['current_wave'] <= 20:
-        game_state['wave_enemies_count'] = 18 + game_state['current_wave']
-        game_state['enemy_types'] = ['NORMAL', 'FAST', 'FLYING', 'TANK', 'STEALTH', 'HEALER', 'BOSS']
-    else:
-        game_state['wave_enemies_count'] = 20 + game_state['current_wave']
-        game_state['enemy_types'] = [e.name for e in EnemyType]
-    
-    game_state['current_wave_enemies'] = 0
-
-def spawn_enemy():
-    if game_state['current_wave_enemies'] < game_state['wave_enemies_count']:
-        # 选择敌人类型
-        if game_state['current_wave'] > 6 and random.random() < 0.5:
-            enemy_type = 'BOSS'
-        else:
-            enemy_type = random.choice(game_state['enemy_types'])
-        
-        # 随机选择起点和对应的路径
-        start_points = [
-            (0, 4),    # 左上
-            (0, 12),   # 左下
-            (34, 8),   # 右边中间
-            (34, 16),  # 右边下方
-            (17, 0),   # 上方
-            (0, 0),    # 左上方
-            (34, 0)    # 右上方
-        ]
-        start_point = random.choice(start_points)
-        
-        # 根据起点选择对应的路径
-        path_index = start_points.index(start_point)
-        enemy_path = get_paths()[path_index]
-        
-        # 创建敌人
-        enemy = create_enemy(enemy_type, enemy_path)
-        enemy['x'] = start_point[0] + random.uniform(-0.1, 0.1)
-        enemy['y'] = start_point[1] + random.uniform(-0.1, 0.1)
-        game_state['enemies'].append(enemy)
-        game_state['current_wave_enemies'] += 1
-        
-        # 如果是治疗者，额外生成集群敌人
-        if enemy_type == 'HEALER':
-            for _ in range(8):
-                swarm = create_enemy('SWARM', enemy_path)
-                swarm['x'] = start_point[0] + random.uniform(-0.1, 0.1)
-                swarm['y'] = start_point[1] + random.uniform(-0.1, 0.1)
-                game_state['enemies'].append(swarm)
-                game_state['current_wave_enemies'] += 1
-
-def create_enemy(enemy_type, path):
-    # 基础属性
-    base_health = 100
-    base_speed = 0.05
-    base_reward = 10
-    
-    # 根据类型调整属性
-    if enemy_type == 'NORMAL':
-        health = base_health
-        speed = base_speed
-        reward = base_reward
-    elif enemy_type == 'FAST':
-        health = base_health * 0.7
-        speed = base_speed * 1.5
-        reward = base_reward * 1.2
-    elif enemy_type == 'TANK':
-        health = base_health * 2.5
-        speed = base_speed * 0.7
-        reward = base_reward * 1.5
-    elif enemy_type == 'BOSS':
-        health = base_health * 5
-        speed = base_speed * 0.8
-        reward = base_reward * 3
-    elif enemy_type == 'FLYING':
-        health = base_health * 1.2
-        speed = base_speed * 1.2
-        reward = base_reward * 1.3
-    elif enemy_type == 'STEALTH':
-        health = base_health * 1.5
-        speed = base_speed * 1.1
-        reward = base_reward * 1.4
-    elif enemy_type == 'HEALER':
-        health = base_health * 1.8
-        speed = base_speed * 0.9
-        reward = base_reward * 1.6
-    else:  # SWARM
-        health = base_health * 0.5
-        speed = base_speed * 1.3
-        reward = base_reward * 0.8
-    
-    # 根据波数增加属性
-    wave_multiplier = 1 + (game_state['current_wave'] - 1) * 0.15
-    health *= wave_multiplier
-    reward *= wave_multiplier
-    
-    return {
-        'type': enemy_type,
-        'health': health,
-        'max_health': health,
-        'speed': speed,
-        'reward': reward,
-        'path': path,
-        'path_index': 0,
-        'frozen': False,
-        'poisoned': False,
-        'poison_duration': 0,
-        'poison_damage': 0,
-        'stealth': False,
-        'heal_cooldown': 0
-    }
-
-def update_enemies():
-    for enemy in game_state['enemies'][:]:
-        # 处理特殊状态
-        if enemy['frozen']:
-            enemy['speed'] = 0
-            enemy['frozen'] = False
-        if enemy['poisoned']:
-            enemy['health'] -= enemy['poison_damage']
-            enemy['poison_duration'] -= 1
-            if enemy['poison_duration'] <= 0:
-                enemy['poisoned'] = False
-        
-        # 处理治疗者
-        if enemy['type'] == 'HEALER' and enemy['heal_cooldown'] <= 0:
-            for other_enemy in game_state['enemies']:
-                if other_enemy != enemy and other_enemy['health'] < other_enemy['max_health']:
-                    other_enemy['health'] = min(other_enemy['max_health'], other_enemy['health'] + 10)
-            enemy['heal_cooldown'] = 60
-        enemy['heal_cooldown'] = max(0, enemy['heal_cooldown'] - 1)
-        
-        # 处理隐身敌人
-        if enemy['type'] == 'STEALTH':
-            enemy['stealth'] = not enemy['stealth']
+    data = request_data()
+    game = find_session(data)
+    if game is None:
+        return jsonify(SESSION_NOT_FOUND)
+    with game.lock:
+        if not game.state['is_running']:
+            return jsonify({'status': 'error', 'message': '游戏未开始'})
         
-        # 更新位置
-        if enemy['path_index'] < len(enemy['path']) - 1:
-            target_x, target_y = enemy['path'][enemy['path_index'] + 1]
-            dx = target_x - enemy['x']
-            dy = target_y - enemy['y']
-            distance = math.sqrt(dx * dx + dy * dy)
-            
-            if distance < enemy['speed']:
-                enemy['path_index'] += 1
-                enemy['x'] = target_x
-                enemy['y'] = target_y
+        # 服务器端模拟循环运行时客户端只读取快照，否则由请求推进一帧
+        if not game.ticker_running():
+            advance_tick(game)
+        frame = build_client_frame(game, data.get('client_id'), data.get('ack'), data.get('keyframe', False),
+                                   encode_binary_frame if wants_binary() else build_frame)
+    return frame_response(frame)
+
+@app.route('/advance', methods=['POST'])
+def advance():
+    # 一次请求连续推进多帧，只返回最后一帧和期间汇总的事件（击杀、漏怪、获得的金钱）
+    data = request_data()
+    game = find_session(data)
+    if game is None:
+        return jsonify(SESSION_NOT_FOUND)
+    ticks = data.get('ticks', 1)
+    if not isinstance(ticks, int) or isinstance(ticks, bool) or ticks < 1:
+        return jsonify({'status': 'error', 'message': '无效的帧数'})
+    with game.lock:
+        if not game.state['is_running']:
+            return jsonify({'status': 'error', 'message': '游戏未开始'})
+        result = game.engine.advance(min(ticks, MAX_ADVANCE_TICKS), ADVANCE_TIME_BUDGET)
+        game.frame_ready.notify_all()
+        frame = build_client_frame(game, data.get('client_id'), data.get('ack'), data.get('keyframe', False))
+        # 因帧数上限或时间预算提前停止时，客户端可以继续请求剩余的帧
+        result['truncated'] = result['ticks'] < ticks and game.state['is_running']
+    result['requested'] = ticks
+    result['events']['rewards'] = round(result['events']['rewards'], 2)
+    frame['advance'] = result
+    return jsonify(frame)
+
+@app.route('/recording')
+def get_recording():
+    # 导出随机种子和玩家输入记录，可用 replay.py 无界面重放
+    game = find_session()
+    if game is None:
+        return SESSION_NOT_FOUND
+    with game.lock:
+        recording = game.engine.recording()
+    return jsonify(recording)
+
+def advance_tick(game):
+    # 推进一帧模拟并通知事件流，返回游戏是否仍在运行；快照在这一帧被发送时才生成
+    running = game.engine.step()
+    game.frame_ready.notify_all()
+    return running
+
+@app.route('/stream')
+def stream():
+    # 通过一个长连接以服务器帧率推送帧：先发关键帧，之后每帧发送相对于上一次推送的增量
+    game = find_session()
+    if game is None:
+        return SESSION_NOT_FOUND, 404
+    return Response(stream_with_context(stream_frames(game)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stream_frames(game):
+    last = None
+    while True:
+        with game.lock:
+            # 等待新的一帧；客户端处理较慢时中间的帧会被合并，只发送最新状态
+            if last is not None and game.state['tick'] == last['tick']:
+                game.frame_ready.wait(STREAM_KEEPALIVE)
+            if game.closed:
+                return
+            if last is not None and game.state['tick'] == last['tick']:
+                frame = None
             else:
-                move_speed = enemy['speed'] * (1.0 + random.uniform(-0.1, 0.1))
-                enemy['x'] += dx * move_speed / distance
-                enemy['y'] += dy * move_speed / distance
-        else:
-            game_state['lives'] -= 1
-            game_state['enemies'].remove(enemy)
-            if game_state['lives'] <= 0:
-                game_state['is_running'] = False
-
-def update_towers():
-    for tower in game_state['towers']:
-        if tower['cooldown'] > 0:
-            tower['cooldown'] -= 1
-            continue
+                current = current_frame(game)
+                frame = build_frame(last, current)
+                last = current
+            running = game.state['is_running']
         
-        # 支援塔效果
-        if tower['type'] == 'SUPPORT':
-            for other_tower in game_state['towers']:
-                if other_tower != tower:
-                    dx = other_tower['x'] - tower['x']
-                    dy = other_tower['y'] - tower['y']
-                    distance = math.sqrt(dx * dx + dy * dy)
-                    if distance <= tower['range']:
-                        other_tower['damage'] *= 1.2
+        if frame is None:
+            yield ': keepalive\n\n'
             continue
-        
-        # 寻找目标
-        if not tower['target'] or tower['target'] not in game_state['enemies']:
-            tower['target'] = None
-            min_distance = float('inf')
-            for enemy in game_state['enemies']:
-                if enemy['stealth'] and tower['type'] != 'SNIPER':
-                    continue
-                dx = enemy['x'] - tower['x']
-                dy = enemy['y'] - tower['y']
-                distance = math.sqrt(dx * dx + dy * dy)
-                if distance <= tower['range'] and distance < min_distance:
-                    tower['target'] = enemy
-                    min_distance = distance
-        
-        # 攻击目标
-        if tower['target']:
-            dx = tower['target']['x'] - tower['x']
-            dy = tower['target']['y'] - tower['y']
-            distance = math.sqrt(dx * dx + dy * dy)
-            
-            if distance <= tower['range']:
-                if tower['type'] == 'CANNON':
-                    for enemy in game_state['enemies'][:]:
-                        ex = enemy['x'] - tower['x']
-                        ey = enemy['y'] - tower['y']
-                        if math.sqrt(ex * ex + ey * ey) <= 1:
-                            enemy['health'] -= tower['damage']
-                            if enemy['health'] <= 0:
-                                game_state['money'] += enemy['reward']
-                                game_state['score'] += enemy['reward']
-                                game_state['enemies'].remove(enemy)
-                elif tower['type'] == 'SNIPER':
-                    damage = tower['damage'] * (2 if random.random() < 0.3 else 1)
-                    tower['target']['health'] -= damage
-                    if tower['target']['health'] <= 0:
-                        game_state['money'] += tower['target']['reward']
-                        game_state['score'] += tower['target']['reward']
-                        game_state['enemies'].remove(tower['target'])
-                        tower['target'] = None
-                elif tower['type'] == 'ICE':
-                    tower['target']['frozen'] = True
-                    tower['target']['health'] -= tower['damage']
-                    if tower['target']['health'] <= 0:
-                        game_state['money'] += tower['target']['reward']
-                        game_state['score'] += tower['target']['reward']
-                        game_state['enemies'].remove(tower['target'])
-                        tower['target'] = None
-                elif tower['type'] == 'POISON':
-                    tower['target']['poisoned'] = True
-                    tower['target']['poison_duration'] = 5
-                    tower['target']['poison_damage'] = tower['damage']
-                    tower['target']['health'] -= tower['damage']
-                    if tower['target']['health'] <= 0:
-                        game_state['money'] += tower['target']['reward']
-                        game_state['score'] += tower['target']['reward']
-                        game_state['enemies'].remove(tower['target'])
-                        tower['target'] = None
-                else:
-                    tower['target']['health'] -= tower['damage']
-                    if tower['target']['health'] <= 0:
-                        game_state['money'] += tower['target']['reward']
-                        game_state['score'] += tower['target']['reward']
-                        game_state['enemies'].remove(tower['target'])
-                        tower['target'] = None
-                
-                tower['cooldown'] = tower['attack_speed']
-
-def get_tower_damage(tower_type):
-    damages = {
-        'ARROW': 30,
-        'CANNON': 75,
-        'MAGIC': 25,
-        'LASER': 45,
-        'ICE': 15,
-        'POISON': 20,
-        'SNIPER': 100,
-        'SUPPORT': 0
-    }
-    return damages.get(tower_type, 30)
-
-def get_tower_attack_speed(tower_type):
-    speeds = {
-        'ARROW': 20,
-        'CANNON': 30,
-        'MAGIC': 15,
-        'LASER': 25,
-        'ICE': 27,
-        'POISON': 20,
-        'SNIPER': 40,
-        'SUPPORT': 0
-    }
-    return speeds.get(tower_type, 20)
-
-def get_tower_range(tower_type):
-    ranges = {
-        'ARROW': 3,
-        'CANNON': 2,
-        'MAGIC': 3,
-        'LASER': 4,
-        'ICE': 3,
-        'POISON': 3,
-        'SNIPER': 5,
-        'SUPPORT': 3
-    }
-    return ranges.get(tower_type, 3)
+        sessions.touch(game)
+        event = 'data: ' + json.dumps(frame, separators=(',', ':')) + '\n\n'
+        if METRICS_ENABLED:
+            STREAM_EVENT_BYTES.observe(len(event))
+        yield event
+        if not running:
+            return
+
+def current_frame(game, record=False):
+    # 当前帧的快照在第一次发送时生成，同一帧的其他请求直接复用；没有客户端读取的帧不生成快照
+    # record 为真时记入帧历史，只用于会确认帧号的轮询客户端；事件流自己保留上一次推送的帧，
+    # 一次性的请求也不会以此为基准，这些快照都不进入帧历史
+    tick = game.state['tick']
+    current = game.latest_frame
+    if current is None or current['tick'] != tick:
+        current = game.latest_frame = take_snapshot(game)
+    frame_history = game.frame_history
+    if record and tick not in frame_history:
+        frame_history[tick] = current
+        while len(frame_history) > FRAME_HISTORY_SIZE:
+            frame_history.popitem(last=False)
+    return current
+
+def take_snapshot(game):
+    return snapshot_state(game.engine)
+
+def build_client_frame(game, client_id, ack, keyframe=False, encode=build_frame):
+    # 记录客户端确认的帧号，并以该帧为基准生成增量；基准帧不可用时退回关键帧
+    # encode 为 build_frame（JSON 帧）或 encode_binary_frame（二进制帧）
+    frame_history = game.frame_history
+    client_acks = game.client_acks
+    if (client_id is not None and not isinstance(client_id, str)
+            or ack is not None and (not isinstance(ack, int) or isinstance(ack, bool))):
+        # 无效的客户端ID或帧号不记录，直接发送关键帧
+        client_id = ack = None
+        keyframe = True
+    if client_id is not None:
+        if ack is not None:
+            client_acks[client_id] = ack
+        if client_id in client_acks:
+            client_acks.move_to_end(client_id)
+            ack = client_acks[client_id]
+        while len(client_acks) > MAX_TRACKED_CLIENTS:
+            client_acks.popitem(last=False)
+    current = current_frame(game, record=ack is not None)
+    base = None if keyframe else frame_history.get(ack)
+    return encode(base, current)
+
+if METRICS_ENABLED:
+    # 快照和增量帧的生成时间作为额外的阶段记录；请求耗时减去各阶段即为 JSON 编码等开销
+    take_snapshot = timed(take_snapshot, metrics.histogram(
+        'tower_defense_tick_phase_seconds', '每帧各阶段的耗时', phase='snapshot'))
+    build_client_frame = timed(build_client_frame, metrics.histogram(
+        'tower_defense_tick_phase_seconds', '每帧各阶段的耗时', phase='build_frame'))
+    STREAM_EVENT_BYTES = metrics.histogram(
+        'tower_defense_response_bytes', '响应体大小，事件流按每个事件统计', SIZE_BUCKETS, endpoint='stream')
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        endpoint = request.endpoint or 'unknown'
+        metrics.histogram('tower_defense_request_seconds', '请求处理耗时（含 JSON 编码）',
+                          endpoint=endpoint).observe(time.perf_counter() - g.request_start)
+        if not response.is_streamed:
+            metrics.histogram('tower_defense_response_bytes', '响应体大小，事件流按每个事件统计',
+                              SIZE_BUCKETS, endpoint=endpoint).observe(response.calculate_content_length() or 0)
+        return response
+
+def collect_game_metrics():
+    # 每个游戏的帧率（相对上一次导出）、实体数量、丢弃的帧数、目标搜索次数和敌人对象池的复用情况
+    now = time.monotonic()
+    ticks_per_second = []
+    enemies = []
+    towers = []
+    dropped = []
+    searches = []
+    deferred = []
+    pool_hits = []
+    pool_misses = []
+    for game in sessions.values():
+        with game.lock:
+            tick = game.state['tick']
+            enemy_count = len(game.state['enemies'])
+            tower_count = len(game.state['towers'])
+            retarget_totals = dict(game.engine.retarget_totals)
+            enemy_pool = game.engine.enemy_pool
+            pool_stats = (enemy_pool.hits, enemy_pool.misses)
+        last_time, last_tick = game.metrics_sample
+        game.metrics_sample = (now, tick)
+        labels = {'game_id': game.id}
+        if now > last_time:
+            ticks_per_second.append((labels, (tick - last_tick) / (now - last_time)))
+        enemies.append((labels, enemy_count))
+        towers.append((labels, tower_count))
+        if game.ticker is not None:
+            dropped.append((labels, game.ticker.dropped))
+        searches.append((labels, retarget_totals['searches']))
+        deferred.append((labels, retarget_totals['deferred']))
+        pool_hits.append((labels, pool_stats[0]))
+        pool_misses.append((labels, pool_stats[1]))
+    yield 'tower_defense_sessions', 'gauge', '当前游戏会话数', [({}, len(enemies))]
+    yield 'tower_defense_game_ticks_per_second', 'gauge', '每个游戏自上次导出以来的帧率', ticks_per_second
+    yield 'tower_defense_game_enemies', 'gauge', '每个游戏当前的敌人数量', enemies
+    yield 'tower_defense_game_towers', 'gauge', '每个游戏当前的塔数量', towers
+    yield 'tower_defense_game_dropped_ticks_total', 'counter', '服务器端模拟追不上时丢弃的帧数', dropped
+    yield 'tower_defense_game_retarget_searches_total', 'counter', '塔搜索目标的次数', searches
+    yield 'tower_defense_game_retargets_deferred_total', 'counter', '因超出每帧时间预算而推迟的目标搜索次数', deferred
+    yield 'tower_defense_game_enemy_pool_hits_total', 'counter', '复用对象池中敌人对象的次数', pool_hits
+    yield 'tower_defense_game_enemy_pool_misses_total', 'counter', '对象池为空而新建敌人对象的次数', pool_misses
+
+metrics.add_collector(collect_game_metrics)
+
+if COMPRESSION_LEVEL > 0:
+    # 在指标统计之前执行（after_request 按注册的相反顺序调用），统计的是压缩后的大小
+    @app.after_request
+    def compress_response(response):
+        if (response.is_streamed or response.direct_passthrough or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or 'gzip' not in request.accept_encodings):
+            return response
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_BYTES:
+            return response
+        response.set_data(gzip.compress(data, COMPRESSION_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+
+@app.route('/metrics')
+def get_metrics():
+    if not METRICS_ENABLED:
+        return {'status': 'error', 'message': '指标未启用'}, 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/paths')
+def get_paths_geometry():
+    return jsonify(PATHS_PAYLOAD)
+
+@app.route('/occupancy')
+def get_occupancy():
+    # 每个格子一个字符：0 空地，1 路径，2 塔；未指定游戏时只包含路径
+    game = find_session()
+    if game is None:
+        cells = PATH_GRID.translate(CELL_CHARS)
+    else:
+        with game.lock:
+            cells = game.engine.occupancy_grid.translate(CELL_CHARS)
+    return jsonify({
+        'width': GRID_WIDTH,
+        'height': GRID_HEIGHT,
+        'cells': cells.decode('ascii')
+    })
 
 @app.route('/assets/<path:filename>')
 def serve_assets(filename):
@@ -433,132 +414,16 @@ def serve_game_images(filename):
 def serve_tower_images(filename):
     return send_from_directory('tower_images', filename)
 
-def is_valid_position(x, y):
-    # 检查是否在网格范围内
-    if not (0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT):
-        return False
-    
-    # 检查是否在路径上
-    for path in get_paths():
-        for px, py in path:
-            if abs(px - x) < 1 and abs(py - y) < 1:
-                return False
-    
-    # 检查是否已有塔
-    for tower in game_state['towers']:
-        if tower['x'] == x and tower['y'] == y:
-            return False
-    
-    return True
-
-def get_tower_cost(tower_type):
-    costs = {
-        'ARROW': 100,
-        'CANNON': 200,
-        'MAGIC': 150,
-        'LASER': 250,
-        'ICE': 175,
-        'POISON': 225,
-        'SNIPER': 300,
-        'SUPPORT': 275
-    }
-    return costs.get(tower_type, 100)
-
-def get_paths():
-    paths = []
-    
-    # 第一条路径（左上到右中）
-    path1 = []
-    path1.append((0, 4))
-    for x in range(1, 12):
-        path1.append((x, 4))
-    for y in range(5, 8):
-        path1.append((11, y))
-    for x in range(10, -1, -1):
-        path1.append((x, 7))
-    for y in range(6, 3, -1):
-        path1.append((0, y))
-    for x in range(1, 20):
-        path1.append((x, 4))
-    paths.append(path1)
-    
-    # 第二条路径（左下到右上）
-    path2 = []
-    path2.append((0, 12))
-    for x in range(1, 15):
-        path2.append((x, 12))
-    for y in range(11, 8, -1):
-        path2.append((14, y))
-    for x in range(15, 25):
-        path2.append((x, 9))
-    for y in range(10, 13):
-        path2.append((24, y))
-    for x in range(23, 18, -1):
-        path2.append((x, 12))
-    paths.append(path2)
-    
-    # 第三条路径（右边到中间）
-    path3 = []
-    path3.append((34, 8))
-    for x in range(33, 28, -1):
-        path3.append((x, 8))
-    for y in range(9, 15):
-        path3.append((28, y))
-    for x in range(29, 32):
-        path3.append((x, 14))
-    paths.append(path3)
-    
-    # 第四条路径（右边到左下）
-    path4 = []
-    path4.append((34, 16))
-    for x in range(33, 28, -1):
-        path4.append((x, 16))
-    for y in range(15, 12, -1):
-        path4.append((28, y))
-    for x in range(27, 22, -1):
-        path4.append((x, 12))
-    paths.append(path4)
-    
-    # 第五条路径（上方到中间）
-    path5 = []
-    path5.append((17, 0))
-    for y in range(1, 6):
-        path5.append((17, y))
-    for x in range(16, 13, -1):
-        path5.append((x, 5))
-    for y in range(6, 9):
-        path5.append((13, y))
-    for x in range(14, 17):
-        path5.append((x, 8))
-    paths.append(path5)
-    
-    # 第六条路径（左上方到右下方）
-    path6 = []
-    path6.append((0, 0))
-    for x in range(1, 8):
-        path6.append((x, x))
-    for x in range(8, 15):
-        path6.append((x, 7))
-    for y in range(8, 15):
-        path6.append((14, y))
-    for x in range(15, 22):
-        path6.append((x, 14))
-    paths.append(path6)
-    
-    # 第七条路径（右上方到左下方）
-    path7 = []
-    path7.append((34, 0))
-    for x in range(33, 26, -1):
-        path7.append((x, 34-x))
-    for x in range(26, 19, -1):
-        path7.append((x, 8))
-    for y in range(9, 16):
-        path7.append((19, y))
-    for x in range(18, 11, -1):
-        path7.append((x, 15))
-    paths.append(path7)
-    
-    return paths
+# 路径几何数据，客户端启动时获取一次
+PATHS_PAYLOAD = {
+    'paths': [{'id': path['id'], 'points': path['points'], 'length': path['length']}
+              for path in PATH_REGISTRY.values()]
+}
+
+# 模块加载完成后，把路径数据、Flask 应用等常驻对象移到垃圾回收不检查的永久代，
+# 完整回收时不再反复遍历这些对象，减少偶发的长停顿
+if GC_FREEZE:
+    gc.freeze()
 
 if __name__ == '__main__':
     # 确保templates目录存在
@@ -630,6 +495,11 @@ if __name__ == '__main__':
             background: #ffed4a;
             transform: scale(1.05);
         }
+        .targeting-select {
+            padding: 10px;
+            font-size: 1rem;
+            border-radius: 5px;
+        }
         .game-info {
             margin-top: 20px;
             display: flex;
@@ -660,6 +530,13 @@ if __name__ == '__main__':
             <button class="tower-button" data-tower="POISON">毒塔 (225)</button>
             <button class="tower-button" data-tower="SNIPER">狙击塔 (300)</button>
             <button class="tower-button" data-tower="SUPPORT">支援塔 (275)</button>
+            <select id="targetingSelect" class="targeting-select">
+                <option value="nearest">攻击最近</option>
+                <option value="first">攻击最前</option>
+                <option value="last">攻击最后</option>
+                <option value="strongest">攻击最强</option>
+                <option value="weakest">攻击最弱</option>
+            </select>
         </div>
         <div class="game-info">
             <div>生命值: <span id="lives">30</span></div>
@@ -670,7 +547,7 @@ if __name__ == '__main__':
         <div class="instructions">
             <h3>游戏说明：</h3>
             <p>1. 点击塔按钮选择要建造的塔</p>
-            <p>2. 点击地图上的空地放置塔</p>
+            <p>2. 点击地图上的空地放置塔，选择攻击策略后点击已有的塔可以修改它的策略</p>
             <p>3. 阻止敌人到达终点</p>
             <p>4. 合理使用不同类型的防御塔来获得胜利</p>
         </div>
@@ -702,6 +579,30 @@ if __name__ == '__main__':
             wave_enemies_count: 0
         };
 
+        // 当前游戏会话ID，由 /start_game 返回
+        let gameId = null;
+
+        // 增量同步状态：本地按ID保存实体，服务器只发送相对于已确认帧的变化
+        const clientId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+        let lastTick = null;
+        let needKeyframe = true;
+        const enemiesById = new Map();
+        const towersById = new Map();
+
+        // 逐帧请求时使用二进制帧格式，类型编号表随关键帧下发
+        const BINARY_MIMETYPE = 'application/vnd.tower-defense.frame';
+        let binaryTypes = null;
+
+        // 服务器端模拟时通过事件流接收帧，否则逐帧请求；同一时间最多一个请求在途
+        let eventSource = null;
+        let requestInFlight = false;
+
+        // 路径数据，启动时从服务器获取一次
+        let paths = [];
+
+        // 占用网格：'0' 空地，'1' 路径，'2' 塔
+        let occupancy = null;
+
         // 获取Canvas上下文
         const canvas = document.getElementById('gameCanvas');
         const ctx = canvas.getContext('2d');
@@ -725,6 +626,10 @@ if __name__ == '__main__':
             // 加载图片资源
             loadImages();
             
+            // 加载路径数据
+            loadPaths();
+            loadOccupancy();
+            
             // 绑定事件监听器
             bindEvents();
             
@@ -741,6 +646,35 @@ if __name__ == '__main__':
             });
         }
 
+        // 从服务器获取路径几何数据
+        function loadPaths() {
+            fetch('/paths')
+                .then(response => response.json())
+                .then(data => {
+                    paths = data.paths.map(path => path.points);
+                })
+                .catch(error => {
+                    console.error('Error loading paths:', error);
+                });
+        }
+
+        // 从服务器获取占用网格
+        function loadOccupancy() {
+            fetch(gameId ? '/occupancy?game_id=' + gameId : '/occupancy')
+                .then(response => response.json())
+                .then(data => {
+                    occupancy = data.cells.split('');
+                })
+                .catch(error => {
+                    console.error('Error loading occupancy:', error);
+                });
+        }
+
+        // 判断格子是否可以放置塔
+        function isCellFree(x, y) {
+            return !occupancy || occupancy[y * GRID_WIDTH + x] === '0';
+        }
+
         // 创建塔的图片
         function createTowerImage(color) {
             const img = document.createElement('canvas');
@@ -784,9 +718,16 @@ if __name__ == '__main__':
             });
         }
 
-        // 放置塔
+        // 放置塔；点击已有的塔时改为当前选择的攻击策略
         function placeTower(x, y) {
-            if (!gameState.is_running || !gameState.selected_tower) return;
+            if (!gameState.is_running) return;
+            const strategy = document.getElementById('targetingSelect').value;
+            const tower = gameState.towers.find(tower => tower.x === x && tower.y === y);
+            if (tower) {
+                setTargeting(tower.id, strategy);
+                return;
+            }
+            if (!gameState.selected_tower || !isCellFree(x, y)) return;
 
             fetch('/place_tower', {
                 method: 'POST',
@@ -794,40 +735,208 @@ if __name__ == '__main__':
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
+                    game_id: gameId,
                     type: gameState.selected_tower,
                     x: x,
-                    y: y
+                    y: y,
+                    strategy: strategy
                 })
             })
             .then(response => response.json())
             .then(data => {
                 if (data.status === 'success') {
-                    updateGameState();
+                    if (!eventSource) {
+                        updateGameState();
+                    }
                 } else {
                     alert(data.message);
                 }
             });
         }
 
+        // 修改塔的攻击策略
+        function setTargeting(towerId, strategy) {
+            fetch('/set_targeting', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    game_id: gameId,
+                    tower_id: towerId,
+                    strategy: strategy
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'success') {
+                    alert(data.message);
+                }
+            });
+        }
+
         // 更新游戏状态
         function updateGameState() {
+            if (requestInFlight) return;
+            requestInFlight = true;
+
             fetch('/update_game', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': BINARY_MIMETYPE + ', application/json'
+                },
+                body: JSON.stringify({
+                    game_id: gameId,
+                    client_id: clientId,
+                    ack: lastTick,
+                    keyframe: needKeyframe
+                })
+            })
+            .then(response => {
+                // 错误响应仍为 JSON
+                if (response.headers.get('Content-Type') === BINARY_MIMETYPE) {
+                    return response.arrayBuffer().then(decodeBinaryFrame);
                 }
+                return response.json();
             })
-            .then(response => response.json())
             .then(data => {
                 if (data.status === 'error') {
                     console.error(data.message);
                     return;
                 }
-                gameState = data;
+                applyFrame(data);
                 updateUI();
             })
             .catch(error => {
                 console.error('Error updating game state:', error);
+            })
+            .finally(() => {
+                requestInFlight = false;
+            });
+        }
+
+        // 连接服务器的帧事件流，断线后浏览器会自动重连并先收到关键帧
+        function connectStream() {
+            if (eventSource) {
+                eventSource.close();
+            }
+            eventSource = new EventSource('/stream?game_id=' + gameId);
+            eventSource.onmessage = event => {
+                applyFrame(JSON.parse(event.data));
+                updateUI();
+                if (!gameState.is_running) {
+                    eventSource.close();
+                }
+            };
+            eventSource.onerror = () => {
+                if (eventSource.readyState === EventSource.CLOSED) {
+                    console.error('Frame stream closed');
+                }
+            };
+        }
+
+        // 应用服务器发送的关键帧或增量帧
+        function applyFrame(frame) {
+            if (frame.keyframe) {
+                enemiesById.clear();
+                towersById.clear();
+            } else if (frame.base !== lastTick || frame.tick <= lastTick) {
+                // 基准帧与本地状态不一致（乱序到达的响应），丢弃
+                return;
+            }
+            Object.assign(gameState, frame.state);
+            applyEntityDelta(enemiesById, frame.enemies);
+            applyEntityDelta(towersById, frame.towers);
+            if (occupancy) {
+                frame.towers.spawned.forEach(tower => {
+                    occupancy[tower.y * GRID_WIDTH + tower.x] = '2';
+                });
+            }
+            gameState.enemies = Array.from(enemiesById.values());
+            gameState.towers = Array.from(towersById.values());
+            lastTick = frame.tick;
+            needKeyframe = false;
+        }
+
+        // 解码二进制帧，转换为与 JSON 帧相同的结构；新增和变化的实体都作为完整记录放在 spawned 中
+        // 各段按 4 字节对齐，直接用类型化数组按记录步长读取（浏览器均为小端序）
+        function decodeBinaryFrame(buffer) {
+            const header = new DataView(buffer, 0, 32);
+            const keyframe = (header.getUint8(5) & 1) === 1;
+            const stateLength = header.getUint16(6, true);
+            const enemyCount = header.getUint32(16, true);
+            const removedEnemyCount = header.getUint32(20, true);
+            const towerCount = header.getUint32(24, true);
+            const removedTowerCount = header.getUint32(28, true);
+            const frame = {
+                keyframe: keyframe,
+                tick: header.getUint32(8, true),
+                state: stateLength ? JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 32, stateLength))) : {},
+                enemies: {spawned: [], removed: [], changed: []},
+                towers: {spawned: [], removed: [], changed: []}
+            };
+            if (keyframe) {
+                binaryTypes = frame.state.types;
+                delete frame.state.types;
+            } else {
+                frame.base = header.getUint32(12, true);
+            }
+
+            let offset = 32 + stateLength;
+            let u8 = new Uint8Array(buffer, offset, enemyCount * 16);
+            let u16 = new Uint16Array(buffer, offset, enemyCount * 8);
+            let u32 = new Uint32Array(buffer, offset, enemyCount * 4);
+            let f32 = new Float32Array(buffer, offset, enemyCount * 4);
+            for (let i = 0; i < enemyCount; i++) {
+                const flags = u8[i * 16 + 5];
+                frame.enemies.spawned.push({
+                    id: u32[i * 4],
+                    type: binaryTypes.enemies[u8[i * 16 + 4]],
+                    x: f32[i * 4 + 2],
+                    y: f32[i * 4 + 3],
+                    health_ratio: u16[i * 8 + 3] / 65535,
+                    stealth: (flags & 1) !== 0,
+                    frozen: (flags & 2) !== 0,
+                    poisoned: (flags & 4) !== 0,
+                    count: (flags >> 3) + 1
+                });
+            }
+            offset += enemyCount * 16;
+
+            u8 = new Uint8Array(buffer, offset, towerCount * 16);
+            u16 = new Uint16Array(buffer, offset, towerCount * 8);
+            u32 = new Uint32Array(buffer, offset, towerCount * 4);
+            for (let i = 0; i < towerCount; i++) {
+                const flags = u8[i * 16 + 7];
+                frame.towers.spawned.push({
+                    id: u32[i * 4],
+                    type: binaryTypes.towers[u8[i * 16 + 4]],
+                    level: u8[i * 16 + 5],
+                    range: u8[i * 16 + 6],
+                    x: u16[i * 8 + 4],
+                    y: u16[i * 8 + 5],
+                    target: (flags & 1) ? u32[i * 4 + 3] : null,
+                    strategy: binaryTypes.strategies[(flags >> 1) & 7]
+                });
+            }
+            offset += towerCount * 16;
+
+            frame.enemies.removed = Array.from(new Uint32Array(buffer, offset, removedEnemyCount));
+            offset += removedEnemyCount * 4;
+            frame.towers.removed = Array.from(new Uint32Array(buffer, offset, removedTowerCount));
+            return frame;
+        }
+
+        // 应用实体的新增、删除和字段变化
+        function applyEntityDelta(entities, delta) {
+            delta.spawned.forEach(entity => entities.set(entity.id, entity));
+            delta.removed.forEach(id => entities.delete(id));
+            delta.changed.forEach(change => {
+                const entity = entities.get(change.id);
+                if (entity) {
+                    Object.assign(entity, change);
+                }
             });
         }
 
@@ -846,12 +955,13 @@ if __name__ == '__main__':
             
             // 绘制游戏元素
             drawGrid();
+            drawBlockedCells();
             drawPaths();
             drawTowers();
             drawEnemies();
             
-            // 更新游戏状态
-            if (gameState.is_running) {
+            // 没有事件流时由客户端请求推进游戏；有事件流时只渲染最后收到的帧
+            if (gameState.is_running && !eventSource) {
                 updateGameState();
             }
             
@@ -876,6 +986,19 @@ if __name__ == '__main__':
             }
         }
 
+        // 将不能放置塔的格子置灰
+        function drawBlockedCells() {
+            if (!occupancy) return;
+            ctx.fillStyle = 'rgba(128, 128, 128, 0.25)';
+            for (let y = 0; y < GRID_HEIGHT; y++) {
+                for (let x = 0; x < GRID_WIDTH; x++) {
+                    if (occupancy[y * GRID_WIDTH + x] !== '0') {
+                        ctx.fillRect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE);
+                    }
+                }
+            }
+        }
+
         // 绘制路径
         function drawPaths() {
             ctx.strokeStyle = '#95a5a6';
@@ -905,12 +1028,7 @@ if __name__ == '__main__':
 
         // 获取路径数据
         function getPaths() {
-            // 这里应该从服务器获取路径数据
-            // 暂时使用示例路径
-            return [
-                [(0, 4), (1, 4), (2, 4), (3, 4), (4, 4)],
-                [(0, 12), (1, 12), (2, 12), (3, 12), (4, 12)]
-            ];
+            return paths;
         }
 
         // 绘制塔
@@ -939,7 +1057,8 @@ if __name__ == '__main__':
                 }
                 
                 // 绘制攻击范围（当有目标时）
-                if (tower.target) {
+                const target = enemiesById.get(tower.target);
+                if (target) {
                     ctx.strokeStyle = towerImages[tower.type].color;
                     ctx.lineWidth = 1;
                     ctx.beginPath();
@@ -953,15 +1072,15 @@ if __name__ == '__main__':
                     ctx.stroke();
                     
                     // 绘制攻击轨迹
-                    if (tower.target) {
+                    if (target) {
                         ctx.strokeStyle = towerImages[tower.type].color;
                         ctx.lineWidth = 2;
                         ctx.setLineDash([4, 4]);
                         ctx.beginPath();
                         ctx.moveTo(x, y);
                         ctx.lineTo(
-                            tower.target.x * GRID_SIZE + GRID_SIZE/2,
-                            tower.target.y * GRID_SIZE + GRID_SIZE/2
+                            target.x * GRID_SIZE + GRID_SIZE/2,
+                            target.y * GRID_SIZE + GRID_SIZE/2
                         );
                         ctx.stroke();
                         ctx.setLineDash([]);
@@ -987,6 +1106,15 @@ if __name__ == '__main__':
                 ctx.arc(x, y, GRID_SIZE/3, 0, Math.PI * 2);
                 ctx.fill();
                 
+                // 集群组显示成员数量
+                if (enemy.count > 1) {
+                    ctx.fillStyle = '#ffffff';
+                    ctx.font = 'bold 11px sans-serif';
+                    ctx.textAlign = 'center';
+                    ctx.textBaseline = 'middle';
+                    ctx.fillText('×' + enemy.count, x, y);
+                }
+                
                 // 恢复透明度
                 ctx.globalAlpha = 1.0;
                 
@@ -1000,7 +1128,8 @@ if __name__ == '__main__':
                 );
                 
                 // 绘制血条
-                const healthRatio = enemy.health / enemy.max_health;
+                // 二进制帧直接给出血量比例
+                const healthRatio = enemy.health_ratio !== undefined ? enemy.health_ratio : enemy.health / enemy.max_health;
                 ctx.fillStyle = '#2ecc71';
                 ctx.fillRect(
                     x - 15,
@@ -1049,8 +1178,15 @@ if __name__ == '__main__':
                 .then(response => response.json())
                 .then(data => {
                     if (data.status === 'success') {
+                        gameId = data.game_id;
                         gameState.is_running = true;
-                        updateGameState();
+                        needKeyframe = true;
+                        loadOccupancy();
+                        if (data.tick_rate > 0) {
+                            connectStream();
+                        } else {
+                            updateGameState();
+                        }
                     } else {
                         alert(data.message);
                     }
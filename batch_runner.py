@@ -0,0 +1,139 @@
+import argparse
+import json
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from engine import GameEngine, ENEMY_STORE_MODE, get_tower_cost
+
+# 批量模拟：用同一个塔布局和一段随机种子在进程池中全速运行多局无界面游戏
+#
+#   python batch_runner.py layout.json --seed-start 0 --games 200 --workers 8
+#
+# 布局文件是按建造顺序排列的塔列表，例如 [{"type": "ARROW", "x": 3, "y": 5}, ...]，
+# 模拟时每帧按顺序建造买得起的塔，钱不够时等待。
+
+DEFAULT_MAX_WAVES = 30
+DEFAULT_MAX_TICKS = 200000
+
+def load_layout(path):
+    if path == '-':
+        layout = json.load(sys.stdin)
+    else:
+        with open(path, encoding='utf-8') as f:
+            layout = json.load(f)
+    if not isinstance(layout, list):
+        raise ValueError('布局文件必须是塔的列表')
+    for tower in layout:
+        if not isinstance(tower, dict) or not {'type', 'x', 'y'} <= tower.keys():
+            raise ValueError('每个塔需要包含 type、x、y: %r' % (tower,))
+    return layout
+
+def play_game(layout, seed, max_waves=DEFAULT_MAX_WAVES, max_ticks=DEFAULT_MAX_TICKS,
+              enemy_store_mode=ENEMY_STORE_MODE):
+    engine = GameEngine(enemy_store_mode, seed)
+    state = engine.state
+    start_lives = state['lives']
+    pending = list(layout)
+    towers_built = 0
+    money_curve = []
+    wave = state['current_wave']
+
+    while state['is_running'] and state['tick'] < max_ticks:
+        # 按布局顺序建造买得起的塔，无效位置直接跳过
+        while pending and state['money'] >= get_tower_cost(pending[0]['type']):
+            tower = pending.pop(0)
+            if engine.place_tower(tower['type'], tower['x'], tower['y'])['status'] == 'success':
+                towers_built += 1
+
+        engine.step()
+
+        # 每波开始时记录一次金钱
+        if state['current_wave'] != wave:
+            wave = state['current_wave']
+            if wave > max_waves:
+                break
+            money_curve.append({'wave': wave, 'tick': state['tick'], 'money': round(state['money'], 2)})
+
+    return {
+        'seed': seed,
+        'waves_survived': max(0, state['current_wave'] - 1),
+        'leaks': start_lives - state['lives'],
+        'game_over': not state['is_running'],
+        'ticks': state['tick'],
+        'towers_built': towers_built,
+        'final_money': round(state['money'], 2),
+        'score': round(state['score'], 2),
+        'money_curve': money_curve
+    }
+
+def summarize(results):
+    waves = [result['waves_survived'] for result in results]
+    leaks = [result['leaks'] for result in results]
+
+    # 每一波开始时的平均金钱（只统计到达该波的游戏）
+    money_by_wave = {}
+    for result in results:
+        for point in result['money_curve']:
+            money_by_wave.setdefault(point['wave'], []).append(point['money'])
+
+    return {
+        'games': len(results),
+        'game_overs': sum(result['game_over'] for result in results),
+        'waves_survived': {
+            'mean': statistics.fmean(waves),
+            'median': statistics.median(waves),
+            'min': min(waves),
+            'max': max(waves)
+        },
+        'leaks': {
+            'mean': statistics.fmean(leaks),
+            'min': min(leaks),
+            'max': max(leaks)
+        },
+        'money_curve': [
+            {'wave': wave, 'games': len(values), 'mean_money': round(statistics.fmean(values), 2)}
+            for wave, values in sorted(money_by_wave.items())
+        ]
+    }
+
+def run_batch(layout, seeds, workers=None, max_waves=DEFAULT_MAX_WAVES, max_ticks=DEFAULT_MAX_TICKS,
+              enemy_store_mode=ENEMY_STORE_MODE):
+    play = partial(play_game, layout, max_waves=max_waves, max_ticks=max_ticks,
+                   enemy_store_mode=enemy_store_mode)
+    if workers == 1:
+        results = [play(seed) for seed in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(play, seeds, chunksize=max(1, len(seeds) // 64)))
+    return {'summary': summarize(results), 'games': results}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='无界面批量运行塔防游戏，用于平衡塔的费用和波次强度')
+    parser.add_argument('layout', help='塔布局 JSON 文件，- 表示从标准输入读取')
+    parser.add_argument('--seed-start', type=int, default=0, help='第一个随机种子')
+    parser.add_argument('--games', type=int, default=100, help='游戏局数，每局使用连续的种子')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--max-waves', type=int, default=DEFAULT_MAX_WAVES, help='每局最多模拟的波数')
+    parser.add_argument('--max-ticks', type=int, default=DEFAULT_MAX_TICKS, help='每局最多模拟的帧数')
+    parser.add_argument('--enemy-store', choices=('dict', 'numpy'), default=ENEMY_STORE_MODE,
+                        help='敌人存储模式')
+    parser.add_argument('--output', help='报告输出文件，默认打印到标准输出')
+    parser.add_argument('--summary-only', action='store_true', help='只输出汇总结果')
+    args = parser.parse_args(argv)
+
+    layout = load_layout(args.layout)
+    seeds = list(range(args.seed_start, args.seed_start + args.games))
+    report = run_batch(layout, seeds, args.workers, args.max_waves, args.max_ticks, args.enemy_store)
+    if args.summary_only:
+        report = report['summary']
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from engine import (GameEngine, ENEMY_STORE_MODE, GRID_WIDTH, GRID_HEIGHT, PATH_REGISTRY, PATH_IDS, SWARM_SIZE,
+                    place_on_path)
+from metrics import ENGINE_PHASES, GcMonitor, instrument_engine
+from protocol import snapshot_state, build_frame, encode_binary_frame
+
+# 每帧耗时基准测试：构造不同塔数量、敌人数量和敌人组合的合成局面，
+# 分阶段统计一帧的耗时，输出可在不同提交之间对比的 JSON 报告
+#
+#   python benchmark.py --output before.json
+#   python benchmark.py --compare before.json
+
+# 计时的阶段，与运行时指标相同；另外单独统计 snapshot，即生成快照，serialize，即由快照生成增量帧并编码为 JSON 字节，
+# 以及 serialize_binary，即由同样的快照编码为二进制帧（不计入每帧耗时，只用于与 serialize 对比两种格式）
+# 另外记录每帧期间的垃圾回收停顿（计入每帧耗时）和敌人对象池的复用次数
+#
+# 服务器在启动时调用 gc.freeze()，基准测试默认不调用，完整回收会遍历更多对象，各阶段耗时中的垃圾回收停顿偏多；
+# 指定 --gc-freeze 时与服务器一样在构造局面之前冻结
+PHASES = ENGINE_PHASES
+
+# 合成局面：burst 表示以治疗者加 8 个集群敌人的方式成组生成，strategy_mix 为塔轮流使用的攻击策略
+SCENARIOS = {
+    'small': {
+        'wave': 3, 'towers': 10, 'tower_mix': ['ARROW', 'MAGIC'],
+        'enemies': 50, 'enemy_mix': ['NORMAL', 'FAST']
+    },
+    'mixed_mid': {
+        'wave': 12, 'towers': 40,
+        'tower_mix': ['ARROW', 'CANNON', 'MAGIC', 'LASER', 'ICE', 'POISON', 'SNIPER'],
+        'enemies': 300, 'enemy_mix': ['NORMAL', 'FAST', 'FLYING', 'TANK', 'STEALTH', 'HEALER']
+    },
+    'healer_swarm_burst': {
+        'wave': 15, 'towers': 40, 'tower_mix': ['ARROW', 'MAGIC', 'LASER', 'POISON'],
+        'enemies': 540, 'enemy_mix': ['HEALER'], 'burst': True
+    },
+    'stealth': {
+        'wave': 15, 'towers': 40, 'tower_mix': ['SNIPER', 'ARROW', 'LASER'],
+        'enemies': 400, 'enemy_mix': ['STEALTH', 'STEALTH', 'NORMAL']
+    },
+    'cannon_splash': {
+        'wave': 20, 'towers': 60, 'tower_mix': ['CANNON'],
+        'enemies': 800, 'enemy_mix': ['SWARM', 'NORMAL', 'TANK']
+    },
+    'late_wave': {
+        'wave': 30, 'towers': 120,
+        'tower_mix': ['ARROW', 'CANNON', 'MAGIC', 'LASER', 'ICE', 'POISON', 'SNIPER'],
+        'enemies': 2000, 'enemy_mix': ['NORMAL', 'FAST', 'TANK', 'BOSS', 'FLYING', 'STEALTH', 'HEALER', 'SWARM']
+    },
+    'late_wave_targeting': {
+        'wave': 30, 'towers': 120,
+        'tower_mix': ['ARROW', 'CANNON', 'MAGIC', 'LASER', 'ICE', 'POISON', 'SNIPER'],
+        'strategy_mix': ['first', 'last', 'strongest', 'weakest', 'nearest'],
+        'enemies': 2000, 'enemy_mix': ['NORMAL', 'FAST', 'TANK', 'BOSS', 'FLYING', 'STEALTH', 'HEALER', 'SWARM']
+    }
+}
+
+def tower_cells(engine, rng):
+    # 优先选择靠近路径的空地，使塔的射程内确实有敌人
+    path_cells = {point for path in PATH_REGISTRY.values() for point in path['points']}
+    cells = [(x, y) for x in range(GRID_WIDTH) for y in range(GRID_HEIGHT)
+             if engine.is_valid_position(x, y)
+             and any((x + dx, y + dy) in path_cells for dx in range(-2, 3) for dy in range(-2, 3))]
+    rng.shuffle(cells)
+    return cells
+
+def add_enemy(engine, rng, enemy_type, path_id, index, count=1):
+    # 把敌人放在路径上的某个路径点之后不远处
+    enemy = engine.create_enemy(enemy_type, path_id, count)
+    place_on_path(enemy, PATH_REGISTRY[path_id]['cumulative_lengths'][index] + rng.uniform(0, 0.2))
+    engine.add_enemy(enemy)
+
+def build_engine(scenario, seed, enemy_store_mode=ENEMY_STORE_MODE, tick_budget=0, swarm_lod=False):
+    rng = random.Random(seed)
+    engine = GameEngine(enemy_store_mode, seed, tick_budget=tick_budget, swarm_lod=swarm_lod)
+    state = engine.state
+    state['money'] = 10 ** 9
+    state['lives'] = 10 ** 9
+    state['current_wave'] = scenario['wave']
+
+    strategies = scenario.get('strategy_mix', ['nearest'])
+    for i, (x, y) in enumerate(tower_cells(engine, rng)[:scenario['towers']]):
+        engine.place_tower(scenario['tower_mix'][i % len(scenario['tower_mix'])], x, y,
+                           strategies[i % len(strategies)])
+
+    # 按成员数计数，集群合并时实体数少于 enemies
+    members = 0
+    while members < scenario['enemies']:
+        enemy_type = rng.choice(scenario['enemy_mix'])
+        path_id = rng.choice(PATH_IDS)
+        index = rng.randrange(len(PATH_REGISTRY[path_id]['points']) - 1)
+        add_enemy(engine, rng, enemy_type, path_id, index)
+        members += 1
+        if scenario.get('burst') and enemy_type == 'HEALER':
+            if swarm_lod:
+                add_enemy(engine, rng, 'SWARM', path_id, index, SWARM_SIZE)
+            else:
+                for _ in range(SWARM_SIZE):
+                    add_enemy(engine, rng, 'SWARM', path_id, index)
+            members += SWARM_SIZE
+
+    # 测试期间持续按当前波次生成敌人
+    state['enemy_types'] = sorted(set(scenario['enemy_mix']))
+    state['wave_enemies_count'] = 10 ** 9
+    return engine
+
+class Samples(list):
+    # 保留每次观测的原始值以便计算分位数，代替直方图传给 metrics 的计时包装
+    def observe(self, value):
+        self.append(value)
+
+class SampleRegistry:
+    # 与 MetricsRegistry.histogram 接口相同，由 instrument_engine 按与运行时指标相同的方式包装引擎
+    def __init__(self):
+        self.samples = {}
+
+    def histogram(self, name, help_text, buckets=None, **labels):
+        return self.samples.setdefault((name, tuple(sorted(labels.items()))), Samples())
+
+    def phase(self, phase):
+        return self.histogram('tower_defense_tick_phase_seconds', None, phase=phase)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def describe(values):
+    total = sum(values)
+    return {
+        'mean_ms': total / len(values) * 1000,
+        'p50_ms': percentile(values, 0.5) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'max_ms': max(values) * 1000,
+        'total_s': total
+    }
+
+def run_scenario(scenario, ticks, warmup, seed, enemy_store_mode=ENEMY_STORE_MODE, tick_budget=0,
+                 swarm_lod=False):
+    engine = build_engine(scenario, seed, enemy_store_mode, tick_budget, swarm_lod)
+    enemies_start = len(engine.state['enemies'])
+    for _ in range(warmup):
+        engine.step()
+
+    retargets_start = dict(engine.retarget_totals)
+    pool_start = (engine.enemy_pool.hits, engine.enemy_pool.misses)
+    registry = SampleRegistry()
+    instrument_engine(engine, registry)
+    samples = {phase: registry.phase(phase) for phase in PHASES}
+    samples['snapshot'] = []
+    samples['serialize'] = []
+    samples['serialize_binary'] = []
+    tick_times = []
+    payload_bytes = []
+    binary_payload_bytes = []
+    gc_times = []
+    last = snapshot_state(engine)
+
+    gc_monitor = GcMonitor()
+    for _ in range(ticks):
+        gc_start = gc_monitor.thread_total()
+        start = time.perf_counter()
+        engine.step()
+        snapshot_start = time.perf_counter()
+        current = snapshot_state(engine)
+        serialize_start = time.perf_counter()
+        payload = json.dumps(build_frame(last, current), separators=(',', ':')).encode('utf-8')
+        end = time.perf_counter()
+        gc_times.append(gc_monitor.thread_total() - gc_start)
+        previous, last = last, current
+        samples['snapshot'].append(serialize_start - snapshot_start)
+        samples['serialize'].append(end - serialize_start)
+        tick_times.append(end - start)
+        payload_bytes.append(len(payload))
+
+        binary_start = time.perf_counter()
+        binary_payload = encode_binary_frame(previous, current)
+        samples['serialize_binary'].append(time.perf_counter() - binary_start)
+        binary_payload_bytes.append(len(binary_payload))
+    gc_monitor.close()
+
+    total = sum(tick_times)
+    phases = {}
+    for phase, values in samples.items():
+        phases[phase] = describe(values)
+        phases[phase]['share'] = phases[phase]['total_s'] / total
+    tick = describe(tick_times)
+    gc_pause = describe(gc_times)
+    return {
+        'params': scenario,
+        'ticks': ticks,
+        'ticks_per_second': ticks / total,
+        'tick_ms': {key: tick[key] for key in ('mean_ms', 'p50_ms', 'p99_ms', 'max_ms')},
+        'phases': phases,
+        'entities': {
+            'towers': len(engine.state['towers']),
+            'enemies_start': enemies_start,
+            'enemies_end': len(engine.state['enemies'])
+        },
+        'retargets': {name: total - retargets_start[name] for name, total in engine.retarget_totals.items()},
+        'enemy_pool': {'hits': engine.enemy_pool.hits - pool_start[0], 'misses': engine.enemy_pool.misses - pool_start[1]},
+        'gc': {
+            'ticks_with_collection': sum(1 for value in gc_times if value),
+            'pause_ms': {key: gc_pause[key] for key in ('mean_ms', 'p99_ms', 'max_ms')}
+        },
+        'payload_bytes_mean': sum(payload_bytes) / len(payload_bytes),
+        'binary_payload_bytes_mean': sum(binary_payload_bytes) / len(binary_payload_bytes)
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report, baseline, threshold):
+    # 对比 p50 帧耗时，变慢超过阈值的场景视为性能回退
+    regressions = []
+    for name, result in report['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if old is None:
+            continue
+        ratio = result['tick_ms']['p50_ms'] / old['tick_ms']['p50_ms']
+        status = 'REGRESSION' if ratio > 1 + threshold else 'ok'
+        print('%-20s p50 %8.3f ms -> %8.3f ms (%+.1f%%) %s' % (
+            name, old['tick_ms']['p50_ms'], result['tick_ms']['p50_ms'], (ratio - 1) * 100, status),
+            file=sys.stderr)
+        if status == 'REGRESSION':
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按场景分阶段测量每帧模拟耗时')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='只运行指定场景，可重复，默认运行全部')
+    parser.add_argument('--ticks', type=int, default=200, help='每个场景计时的帧数')
+    parser.add_argument('--warmup', type=int, default=20, help='计时前预热的帧数')
+    parser.add_argument('--seed', type=int, default=0, help='构造局面和模拟使用的随机种子')
+    parser.add_argument('--enemy-store', choices=('dict', 'numpy'), default=ENEMY_STORE_MODE,
+                        help='敌人存储模式')
+    parser.add_argument('--tick-budget', type=float, default=0,
+                        help='每帧时间预算（秒），超出时推迟目标搜索；默认不限制，结果可重现')
+    parser.add_argument('--swarm-lod', action='store_true', help='集群敌人按组模拟')
+    parser.add_argument('--gc-freeze', action='store_true', help='与服务器一样在开始前调用 gc.freeze()')
+    parser.add_argument('--output', help='报告输出文件，默认打印到标准输出')
+    parser.add_argument('--compare', help='用于对比的历史报告')
+    parser.add_argument('--threshold', type=float, default=0.10, help='p50 变慢超过该比例时判定为回退')
+    args = parser.parse_args(argv)
+
+    names = args.scenario or list(SCENARIOS)
+    if args.gc_freeze:
+        gc.freeze()
+    else:
+        print('注意：未调用 gc.freeze()（服务器启动时会调用），各阶段耗时包含更多垃圾回收停顿；'
+              '可用 --gc-freeze 与服务器保持一致', file=sys.stderr)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'ticks': args.ticks,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'enemy_store': args.enemy_store,
+            'tick_budget': args.tick_budget,
+            'swarm_lod': args.swarm_lod,
+            'gc_freeze': args.gc_freeze
+        },
+        'scenarios': {}
+    }
+    for name in names:
+        result = run_scenario(SCENARIOS[name], args.ticks, args.warmup, args.seed, args.enemy_store,
+                              args.tick_budget, args.swarm_lod)
+        report['scenarios'][name] = result
+        print('%-20s %8.1f ticks/s  p50 %7.3f ms  p99 %7.3f ms' % (
+            name, result['ticks_per_second'], result['tick_ms']['p50_ms'], result['tick_ms']['p99_ms']),
+            file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+import numpy as np
+from entities import ICE_SLOW_FACTOR, HEAL_INTERVAL, STEALTH_PHASE_TICKS, ENEMY_TYPE_NAMES, ENEMY_TYPE_CODES
+
+HEALER_CODE = ENEMY_TYPE_CODES['HEALER']
+STEALTH_CODE = ENEMY_TYPE_CODES['STEALTH']
+
+# 每个字段对应一个连续数组
+COLUMNS = {
+    'id': np.int64,
+    'type': np.int8,
+    'x': np.float64,
+    'y': np.float64,
+    'health': np.float64,
+    'max_health': np.float64,
+    'speed': np.float64,
+    'reward': np.float64,
+    'path_id': np.int16,
+    'path_index': np.int32,
+    'progress': np.float64,
+    'frozen': np.bool_,
+    'frozen_until': np.int64,
+    'poisoned': np.bool_,
+    'poison_duration': np.int32,
+    'poison_damage': np.float64,
+    'stealth': np.bool_,
+    'stealth_at': np.int64,
+    'heal_at': np.int64,
+    'count': np.int32,
+    'member_health': np.float64
+}
+
+def build_path_arrays(path_registry):
+    # 把所有路径填充到同一个二维数组中，按 path_id 和 path_index 直接索引
+    # 返回 (路径点, 路径点数量, 累计弧长, 线段长度, 路径总长)；填充部分的累计弧长为无穷大
+    count = max(path_registry) + 1
+    max_points = max(len(path['points']) for path in path_registry.values())
+    points = np.zeros((count, max_points, 2), dtype=np.float64)
+    lengths = np.zeros(count, dtype=np.int32)
+    cumulative = np.full((count, max_points), np.inf)
+    segment_lengths = np.ones((count, max_points), dtype=np.float64)
+    totals = np.zeros(count, dtype=np.float64)
+    for path_id, path in path_registry.items():
+        path_points = np.asarray(path['points'], dtype=np.float64)
+        points[path_id, :len(path_points)] = path_points
+        points[path_id, len(path_points):] = path_points[-1]
+        lengths[path_id] = len(path_points)
+        cumulative[path_id, :len(path_points)] = path['cumulative_lengths']
+        segment_lengths[path_id, :len(path_points) - 1] = path['segment_lengths']
+        totals[path_id] = path['length']
+    return points, lengths, cumulative, segment_lengths, totals
+
+class EnemyView:
+    # 指向数组中某一行的轻量视图，提供与 Enemy 对象相同的字段访问方式
+    __slots__ = ('store', 'slot', 'id')
+
+    def __init__(self, store, slot, entity_id):
+        object.__setattr__(self, 'store', store)
+        object.__setattr__(self, 'slot', slot)
+        object.__setattr__(self, 'id', entity_id)
+
+    def __getattr__(self, name):
+        # 只有视图本身没有的字段才会到这里，从对应的列读取
+        column = self.store.columns.get(name) if name not in EnemyView.__slots__ else None
+        if column is None:
+            raise AttributeError(name)
+        value = column[self.slot]
+        if name == 'type':
+            return ENEMY_TYPE_NAMES[value]
+        return value.item()
+
+    def __setattr__(self, name, value):
+        if name == 'slot':
+            object.__setattr__(self, name, value)
+            return
+        if name == 'type':
+            value = ENEMY_TYPE_CODES[value]
+        self.store.columns[name][self.slot] = value
+
+class EnemyArrays:
+    # 结构数组形式的敌人存储：每个字段一个 NumPy 数组，删除时用末尾元素填补空位
+    # heal_radius 为治疗者光环半径，为 0 时治疗全场
+    def __init__(self, path_arrays, rng, heal_radius=0, capacity=256):
+        (self.path_points, self.path_lengths, self.path_cumulative,
+         self.path_segment_lengths, self.path_totals) = path_arrays
+        self.rng = rng
+        self.heal_radius = heal_radius
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.views = []
+        self.by_id = {}
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(list(self.views))
+
+    def __contains__(self, view):
+        return isinstance(view, EnemyView) and view.store is self and view.slot >= 0
+
+    def get(self, entity_id):
+        return self.by_id.get(entity_id)
+
+    def _grow(self):
+        capacity = len(self.columns['id']) * 2
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def append(self, enemy):
+        if self.size == len(self.columns['id']):
+            self._grow()
+        slot = self.size
+        for name in COLUMNS:
+            value = getattr(enemy, name)
+            if name == 'type':
+                value = ENEMY_TYPE_CODES[value]
+            self.columns[name][slot] = value
+        view = EnemyView(self, slot, enemy.id)
+        self.views.append(view)
+        self.by_id[view.id] = view
+        self.size += 1
+        return view
+
+    def remove(self, view):
+        if view not in self:
+            raise ValueError('enemy not in store')
+        self._remove_slot(view.slot)
+
+    def _remove_slot(self, slot):
+        last = self.size - 1
+        removed = self.views[slot]
+        if slot != last:
+            for column in self.columns.values():
+                column[slot] = column[last]
+            moved = self.views[last]
+            moved.slot = slot
+            self.views[slot] = moved
+        self.views.pop()
+        del self.by_id[removed.id]
+        removed.slot = -1
+        self.size = last
+
+    def index_columns(self):
+        # 空间索引重建所需的实体和坐标列
+        n = self.size
+        c = self.columns
+        return list(self.views), c['x'][:n].tolist(), c['y'][:n].tolist(), c['stealth'][:n].tolist()
+
+    def progress_columns(self):
+        # 路径位置索引刷新所需的实体、ID、路径、距离和隐身状态列，以及 ID 到行号的映射
+        n = self.size
+        c = self.columns
+        ids = c['id'][:n].tolist()
+        return (list(self.views), ids, c['path_id'][:n].tolist(), c['progress'][:n].tolist(),
+                c['stealth'][:n].tolist(), dict(zip(ids, range(n))))
+
+    def health_of(self, views):
+        # 一组敌人的当前血量，整列转换一次再按行读取
+        health = self.columns['health'][:self.size].tolist()
+        return [health[view.slot] for view in views]
+
+    def snapshot_rows(self, type_names=ENEMY_TYPE_NAMES):
+        # 序列化时才把数组转换为 Python 值
+        # 集群组的生命值和最大生命值为全部成员的合计
+        n = self.size
+        c = self.columns
+        count = c['count'][:n]
+        health = c['health'][:n] + (count - 1) * c['member_health'][:n]
+        rows = zip(
+            [type_names[code] for code in c['type'][:n].tolist()],
+            np.round(c['x'][:n], 2).tolist(),
+            np.round(c['y'][:n], 2).tolist(),
+            np.round(health, 1).tolist(),
+            np.round(c['max_health'][:n] * count, 1).tolist(),
+            c['stealth'][:n].tolist(),
+            c['frozen'][:n].tolist(),
+            c['poisoned'][:n].tolist(),
+            count.tolist()
+        )
+        return dict(zip(c['id'][:n].tolist(), rows))
+
+    def update(self, tick):
+        # 批量更新整波敌人的状态和位置，返回本帧到达终点的敌人数量（集群组按成员数计算）
+        n = self.size
+        if n == 0:
+            return 0
+        c = self.columns
+        enemy_type = c['type'][:n]
+        health = c['health'][:n]
+        speed = c['speed'][:n]
+
+        # 处理特殊状态：各种状态记录的是结束或下一次触发的帧号，与当前帧比较即可批量判断
+        frozen = c['frozen'][:n]
+        np.greater(c['frozen_until'][:n], tick, out=frozen)
+        poisoned = c['poisoned'][:n]
+        poison_duration = c['poison_duration'][:n]
+        health[poisoned] -= c['poison_damage'][:n][poisoned]
+        poison_duration[poisoned] -= 1
+        poisoned &= poison_duration > 0
+
+        # 处理治疗者：本帧所有到期的治疗者一次性结算，每个敌人不会被自己治疗
+        heal_at = c['heal_at'][:n]
+        healers = (enemy_type == HEALER_CODE) & (heal_at <= tick)
+        healer_count = int(np.count_nonzero(healers))
+        if healer_count:
+            max_health = c['max_health'][:n]
+            if self.heal_radius:
+                # 治疗者与所有敌人的距离矩阵，统计每个敌人位于多少个光环内
+                x = c['x'][:n]
+                y = c['y'][:n]
+                dx = x[np.newaxis, :] - x[healers][:, np.newaxis]
+                dy = y[np.newaxis, :] - y[healers][:, np.newaxis]
+                covered = np.count_nonzero(dx * dx + dy * dy <= self.heal_radius * self.heal_radius, axis=0)
+                heal = 10.0 * (covered - healers)
+            else:
+                heal = 10.0 * (healer_count - healers)
+            wounded = health < max_health
+            health[wounded] = np.minimum(max_health[wounded], health[wounded] + heal[wounded])
+            # 集群组的其余成员同样被治疗
+            member_health = c['member_health'][:n]
+            wounded = (c['count'][:n] > 1) & (member_health < max_health)
+            member_health[wounded] = np.minimum(max_health[wounded], member_health[wounded] + heal[wounded])
+            heal_at[healers] = tick + HEAL_INTERVAL
+
+        # 处理隐身敌人
+        stealth_at = c['stealth_at'][:n]
+        phase_change = (enemy_type == STEALTH_CODE) & (stealth_at <= tick)
+        c['stealth'][:n] ^= phase_change
+        stealth_at[phase_change] = tick + STEALTH_PHASE_TICKS
+
+        # 沿路径前进：累加走过的距离，再从缓存的线段下标向后推进到所在线段并插值出坐标
+        path_id = c['path_id'][:n]
+        path_index = c['path_index'][:n]
+        progress = c['progress'][:n]
+        total = self.path_totals[path_id]
+        leaked = progress >= total
+        moving = ~leaked
+        speed = np.where(frozen, speed * ICE_SLOW_FACTOR, speed)
+        progress[moving] += speed[moving] * (1.0 + self.rng.uniform(-0.1, 0.1, size=int(np.count_nonzero(moving))))
+        last_segment = self.path_lengths[path_id] - 2
+        while True:
+            next_index = np.minimum(path_index + 1, last_segment + 1)
+            advance = (path_index < last_segment) & (self.path_cumulative[path_id, next_index] <= progress)
+            if not advance.any():
+                break
+            path_index[advance] += 1
+        segment = np.minimum(path_index, last_segment)
+        start = self.path_points[path_id, segment]
+        end = self.path_points[path_id, segment + 1]
+        t = np.minimum((progress - self.path_cumulative[path_id, segment])
+                       / self.path_segment_lengths[path_id, segment], 1.0)
+        c['x'][:n] = start[:, 0] + (end[:, 0] - start[:, 0]) * t
+        c['y'][:n] = start[:, 1] + (end[:, 1] - start[:, 1]) * t
+        finished = moving & (progress >= total)
+        path_index[finished] = last_segment[finished] + 1
+
+        # 移除到达终点的敌人（从后往前删除，保证填补空位时不会漏掉）
+        leaked_slots = np.flatnonzero(leaked)
+        leaked_count = int(c['count'][:n][leaked_slots].sum())
+        for slot in leaked_slots[::-1].tolist():
+            self._remove_slot(slot)
+        return leaked_count
@@ -0,0 +1,913 @@
+import hashlib
+import math
+import os
+import random
+import time
+from enum import Enum
+from entities import (Enemy, Tower, ENEMY_PROTOTYPES, DEFAULT_ENEMY_TYPE, tower_prototype, ICE_SLOW_FACTOR,
+                      ICE_SLOW_TICKS, POISON_TICKS, HEAL_INTERVAL, STEALTH_PHASE_TICKS,
+                      TARGETING_STRATEGIES, DEFAULT_TARGETING)
+from entity_table import EntityTable
+from object_pool import ObjectPool
+from progress_index import ProgressIndex
+from spatial_index import SpatialHash
+from timer_wheel import TimerWheel
+
+# NumPy 为可选依赖，仅在数组引擎模式下使用
+try:
+    import numpy as np
+    from enemy_arrays import EnemyArrays, build_path_arrays
+except ImportError:
+    np = None
+    EnemyArrays = None
+
+# 游戏常量
+GRID_SIZE = 30
+GRID_WIDTH = 35
+GRID_HEIGHT = 18
+CANVAS_WIDTH = GRID_WIDTH * GRID_SIZE
+CANVAS_HEIGHT = GRID_HEIGHT * GRID_SIZE
+
+# 敌人存储模式：'dict' 为每个敌人一个字典，'numpy' 为结构数组批量更新
+ENEMY_STORE_MODE = os.environ.get('TOWER_DEFENSE_ENEMY_STORE', 'dict')
+
+# 录像格式版本
+RECORDING_VERSION = 9
+
+# 敌人空间索引的格子边长（以游戏格子为单位）
+ENEMY_INDEX_CELL_SIZE = 2
+
+# 定时器时间轮的槽数，应大于大多数定时器的间隔
+TIMER_WHEEL_SLOTS = 256
+
+# 目标搜索分批：没有目标的塔按ID轮流分到若干组，每帧只有一组搜索目标，避免大量目标同时死亡时集中重新搜索
+RETARGET_BUCKETS = 4
+
+# 每帧的时间预算（秒）用完后推迟剩余的目标搜索，但至少保证这么多次搜索
+MIN_RETARGETS_PER_TICK = 10
+
+# 回收的敌人对象最多保留多少个，超出的部分交给垃圾回收
+ENEMY_POOL_SIZE = 2048
+
+# 新生成的敌人在路径起点之后随机错开的最大距离
+SPAWN_SPREAD = 0.2
+
+# 每个覆盖某座塔的支援塔使其伤害乘以该倍数
+SUPPORT_DAMAGE_MULTIPLIER = 1.2
+
+# 治疗者光环半径（以游戏格子为单位），为 0 时治疗全场的敌人
+HEAL_RADIUS = float(os.environ.get('TOWER_DEFENSE_HEAL_RADIUS', 0))
+
+# 每个治疗者带来的集群敌人数量；开启集群合并时这些敌人作为一个组实体模拟，
+# 只在被冰冻或中毒、与组内其他成员不再一致时拆分出单独的敌人
+SWARM_SIZE = 8
+SWARM_LOD = os.environ.get('TOWER_DEFENSE_SWARM_LOD', '0') == '1'
+
+# 占用网格的格子状态
+CELL_FREE = 0
+CELL_PATH = 1
+CELL_TOWER = 2
+CELL_CHARS = bytes.maketrans(bytes([CELL_FREE, CELL_PATH, CELL_TOWER]), b'012')
+
+class EnemyType(Enum):
+    NORMAL = 1    # 普通敌人：基础属性
+    FAST = 2      # 快速敌人：移动速度快
+    TANK = 3      # 坦克敌人：生命值高
+    BOSS = 4      # Boss敌人：全属性高
+    FLYING = 5    # 飞行敌人：无视地形
+    STEALTH = 6   # 隐身敌人：周期性隐身
+    HEALER = 7    # 治疗者：治疗其他敌人
+    SWARM = 8     # 集群敌人：数量多
+
+def new_game_state(enemy_store_mode=ENEMY_STORE_MODE, rng=None, heal_radius=HEAL_RADIUS):
+    return {
+        'towers': EntityTable(),
+        'enemies': new_enemy_store(enemy_store_mode, rng, heal_radius),
+        'current_wave': 0,
+        'lives': 30,
+        'money': 300,
+        'score': 0,
+        'is_running': True,
+        'selected_tower': 'ARROW',
+        'wave_timer': 0,
+        'wave_interval': 200,
+        'enemy_spawn_timer': 0,
+        'enemy_spawn_interval': 12,
+        'current_wave_enemies': 0,
+        'wave_enemies_count': 0,
+        'enemy_types': [],
+        'tick': 0,
+        'next_id': 1
+    }
+
+def new_enemy_store(mode=ENEMY_STORE_MODE, rng=None, heal_radius=HEAL_RADIUS):
+    if mode == 'numpy':
+        if EnemyArrays is None:
+            raise RuntimeError('numpy 敌人存储模式需要安装 NumPy')
+        # 数组引擎的随机数由游戏的随机数生成器派生，保证同一种子的结果可重现
+        seed = rng.getrandbits(64) if rng is not None else None
+        return EnemyArrays(PATH_ARRAYS, np.random.default_rng(seed), heal_radius)
+    return EntityTable()
+
+class GameEngine:
+    # 无界面的游戏模拟：包含一局游戏的全部状态和每帧的更新流程，不依赖 Flask
+    # 所有随机数都来自 self.rng，同一种子加同一份玩家输入记录即可重现整局游戏
+    def __init__(self, enemy_store_mode=ENEMY_STORE_MODE, seed=None, heal_radius=HEAL_RADIUS, tick_budget=0,
+                 swarm_lod=SWARM_LOD):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        self.seed = seed
+        self.enemy_store_mode = enemy_store_mode
+        self.heal_radius = heal_radius
+        self.swarm_lod = swarm_lod
+        self.rng = random.Random(seed)
+        # 只追加的玩家输入记录，每条记录生效时的帧号
+        self.input_log = []
+        self.state = new_game_state(enemy_store_mode, self.rng, heal_radius)
+        self.occupancy_grid = bytearray(PATH_GRID)
+        self.enemy_index = SpatialHash(ENEMY_INDEX_CELL_SIZE)
+        # 按路径位置排序的敌人索引，只在有塔使用非 nearest 策略时每帧刷新
+        # 以及每座攻击塔的射程在各条路径上覆盖的距离区间（塔ID -> 区间列表），放置时计算一次
+        self.progress_index = ProgressIndex()
+        self.progress_index_tick = None
+        self.tower_coverage = {}
+        # 支援塔增益图：支援塔ID -> 其射程内的塔ID集合
+        self.support_links = {}
+        # 开局以来的累计事件数，快进时按前后差值汇总
+        self.event_totals = {'kills': 0, 'leaks': 0, 'rewards': 0}
+        # 状态效果、周期行为和塔装填的定时器；只有已装填的塔在每帧检查攻击（塔ID -> 塔）
+        self.timers = TimerWheel(TIMER_WHEEL_SLOTS)
+        self.idle_towers = {}
+        # 每帧的时间预算（秒），为 0 时不限制；超出预算被推迟的塔下一帧排在最前面搜索
+        # 预算与机器速度有关，截断时把本帧完成的搜索次数写入输入记录，重放时按记录截断；
+        # 连续多帧的截断次数相同时合并为一条记录，避免输入记录随超出预算的帧数无限增长
+        self.tick_budget = tick_budget
+        self.tick_deadline = None
+        self.retarget_limits = {}
+        self.deferred_retargets = set()
+        self.retarget_totals = {'searches': 0, 'deferred': 0}
+        # 敌人对象池：被消灭或到达终点的敌人对象归还后在生成新敌人时原地重置复用，减少每帧的分配和垃圾回收
+        # 数组存储模式下敌人对象只在加入存储前临时使用，加入后立即归还
+        self.enemy_pool = ObjectPool(Enemy, ENEMY_POOL_SIZE)
+
+    def step(self):
+        # 推进一帧模拟，返回游戏是否仍在运行
+        game_state = self.state
+        if not game_state['is_running']:
+            return False
+
+        if self.tick_budget:
+            self.tick_deadline = time.perf_counter() + self.tick_budget
+
+        # 更新波次并生成敌人
+        self.update_waves()
+
+        # 更新敌人位置和状态
+        self.update_enemies()
+
+        # 更新塔的攻击
+        self.update_towers()
+
+        game_state['tick'] += 1
+        return game_state['is_running']
+
+    def advance(self, ticks, time_budget=None):
+        # 连续推进多帧，中间帧不做任何序列化；超过时间预算（秒）时提前停止
+        # 返回实际推进的帧数和期间汇总的事件
+        game_state = self.state
+        before = dict(self.event_totals)
+        wave = game_state['current_wave']
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        done = 0
+        while done < ticks and game_state['is_running']:
+            self.step()
+            done += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        events = {name: total - before[name] for name, total in self.event_totals.items()}
+        events['waves_started'] = game_state['current_wave'] - wave
+        return {'ticks': done, 'events': events}
+
+    def update_waves(self):
+        game_state = self.state
+
+        # 更新波次计时器
+        game_state['wave_timer'] += 1
+        game_state['enemy_spawn_timer'] += 1
+
+        # 检查是否需要开始新的波次
+        if game_state['wave_timer'] >= game_state['wave_interval'] and not game_state['enemies']:
+            self.start_new_wave()
+            game_state['wave_timer'] = 0
+
+        # 在当前波次中生成敌人
+        if (game_state['current_wave_enemies'] < game_state['wave_enemies_count'] and 
+            game_state['enemy_spawn_timer'] >= game_state['enemy_spawn_interval']):
+            self.spawn_enemy()
+            game_state['enemy_spawn_timer'] = 0
+
+    def place_tower(self, tower_type, x, y, strategy=DEFAULT_TARGETING):
+        game_state = self.state
+
+        # 检查位置是否有效
+        if not self.is_valid_position(x, y):
+            return {'status': 'error', 'message': '无效的位置'}
+
+        if strategy not in TARGETING_STRATEGIES:
+            return {'status': 'error', 'message': '无效的攻击策略'}
+
+        # 检查金钱是否足够
+        cost = get_tower_cost(tower_type)
+        if game_state['money'] < cost:
+            return {'status': 'error', 'message': '金钱不足'}
+
+        # 添加塔
+        tower = game_state['towers'].append(Tower(self.next_entity_id(), tower_type, x, y, strategy))
+        self.link_support_buffs(tower)
+        # 支援塔不攻击，不参与每帧的攻击检查
+        if tower_type != 'SUPPORT':
+            self.idle_towers[tower.id] = tower
+            self.tower_coverage[tower.id] = path_coverage(x, y, tower.range)
+        self.set_cell(x, y, CELL_TOWER)
+        game_state['money'] -= cost
+        self.input_log.append({'tick': game_state['tick'], 'command': 'place_tower',
+                               'type': tower_type, 'x': x, 'y': y, 'strategy': strategy})
+
+        return {'status': 'success', 'message': '塔已放置'}
+
+    def set_targeting(self, tower_id, strategy):
+        # 修改塔的攻击策略，下一次攻击时按新策略重新选择目标
+        tower = self.state['towers'].get(tower_id) if isinstance(tower_id, int) else None
+        if tower is None:
+            return {'status': 'error', 'message': '塔不存在'}
+        if strategy not in TARGETING_STRATEGIES:
+            return {'status': 'error', 'message': '无效的攻击策略'}
+        tower.strategy = strategy
+        tower.target = None
+        self.input_log.append({'tick': self.state['tick'], 'command': 'set_targeting',
+                               'tower_id': tower_id, 'strategy': strategy})
+        return {'status': 'success', 'message': '攻击策略已更新'}
+
+    def link_support_buffs(self, tower):
+        # 支援塔的增益关系只在塔变化时更新，每帧的塔更新不需要再计算
+        towers = self.state['towers']
+        if tower.type == 'SUPPORT':
+            covered = self.support_links[tower.id] = set()
+            for other in towers:
+                if other is not tower and in_support_range(tower, other):
+                    covered.add(other.id)
+                    self.apply_damage_multiplier(other, SUPPORT_DAMAGE_MULTIPLIER)
+        for support_id, covered in self.support_links.items():
+            support = towers.get(support_id)
+            if support is not tower and in_support_range(support, tower):
+                covered.add(tower.id)
+                self.apply_damage_multiplier(tower, SUPPORT_DAMAGE_MULTIPLIER)
+
+    def apply_damage_multiplier(self, tower, multiplier):
+        tower.damage_multiplier *= multiplier
+        tower.damage = tower.base_damage * tower.damage_multiplier
+
+    def apply_input(self, command):
+        if command['command'] == 'place_tower':
+            return self.place_tower(command['type'], command['x'], command['y'],
+                                    command.get('strategy', DEFAULT_TARGETING))
+        if command['command'] == 'set_targeting':
+            return self.set_targeting(command['tower_id'], command['strategy'])
+        if command['command'] == 'retarget_limit':
+            # 从 tick 开始连续 ticks 帧（默认 1 帧）每帧最多搜索 limit 次
+            for tick in range(command['tick'], command['tick'] + command.get('ticks', 1)):
+                self.retarget_limits[tick] = command['limit']
+            return {'status': 'success'}
+        raise ValueError('未知的输入命令: %r' % (command['command'],))
+
+    def state_digest(self):
+        # 局面摘要，用于确认重放得到完全相同的状态
+        game_state = self.state
+        parts = [repr((game_state['tick'], game_state['current_wave'], game_state['lives'],
+                       game_state['money'], game_state['score'], game_state['is_running']))]
+        for enemy in game_state['enemies']:
+            parts.append(repr((enemy.id, enemy.type, enemy.progress, enemy.health,
+                               enemy.path_index, enemy.stealth, enemy.poisoned, enemy.count, enemy.member_health)))
+        for tower in game_state['towers']:
+            parts.append(repr((tower.id, tower.type, tower.x, tower.y, tower.id in self.idle_towers,
+                               tower.damage, tower.target, tower.strategy)))
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def recording(self):
+        return {
+            'version': RECORDING_VERSION,
+            'seed': self.seed,
+            'enemy_store': self.enemy_store_mode,
+            'heal_radius': self.heal_radius,
+            'swarm_lod': self.swarm_lod,
+            'tick': self.state['tick'],
+            'digest': self.state_digest(),
+            'inputs': [dict(command) for command in self.input_log]
+        }
+
+    def next_entity_id(self):
+        game_state = self.state
+        entity_id = game_state['next_id']
+        game_state['next_id'] += 1
+        return entity_id
+
+    def start_new_wave(self):
+        game_state = self.state
+        game_state['current_wave'] += 1
+
+        # 根据波数设置敌人数量和类型
+        if game_state['current_wave'] <= 5:
+            game_state['wave_enemies_count'] = 10 + game_state['current_wave']
+            game_state['enemy_types'] = ['NORMAL', 'FAST']
+        elif game_state['current_wave'] <= 10:
+            game_state['wave_enemies_count'] = 12 + game_state['current_wave']
+            game_state['enemy_types'] = ['NORMAL', 'FAST', 'FLYING', 'TANK']
+        elif game_state['current_wave'] <= 15:
+            game_state['wave_enemies_count'] = 15 + game_state['current_wave']
+            game_state['enemy_types'] = ['NORMAL', 'FAST', 'FLYING', 'TANK', 'STEALTH', 'HEALER']
+        elif game_state['current_wave'] <= 20:
+            game_state['wave_enemies_count'] = 18 + game_state['current_wave']
+            game_state['enemy_types'] = ['NORMAL', 'FAST', 'FLYING', 'TANK', 'STEALTH', 'HEALER', 'BOSS']
+        else:
+            game_state['wave_enemies_count'] = 20 + game_state['current_wave']
+            game_state['enemy_types'] = [e.name for e in EnemyType]
+
+        game_state['current_wave_enemies'] = 0
+
+    def spawn_enemy(self):
+        game_state = self.state
+        if game_state['current_wave_enemies'] < game_state['wave_enemies_count']:
+            # 选择敌人类型
+            if game_state['current_wave'] > 6 and self.rng.random() < 0.5:
+                enemy_type = 'BOSS'
+            else:
+                enemy_type = self.rng.choice(game_state['enemy_types'])
+
+            # 随机选择路径，从起点附近出发，同时生成的敌人沿路径略微错开
+            path_id = self.rng.choice(PATH_IDS)
+
+            # 创建敌人
+            enemy = self.create_enemy(enemy_type, path_id)
+            place_on_path(enemy, self.rng.uniform(0, SPAWN_SPREAD))
+            self.add_enemy(enemy)
+            game_state['current_wave_enemies'] += 1
+
+            # 如果是治疗者，额外生成集群敌人
+            if enemy_type == 'HEALER':
+                if self.swarm_lod:
+                    swarm = self.create_enemy('SWARM', path_id, SWARM_SIZE)
+                    place_on_path(swarm, self.rng.uniform(0, SPAWN_SPREAD))
+                    self.add_enemy(swarm)
+                else:
+                    for _ in range(SWARM_SIZE):
+                        swarm = self.create_enemy('SWARM', path_id)
+                        place_on_path(swarm, self.rng.uniform(0, SPAWN_SPREAD))
+                        self.add_enemy(swarm)
+                game_state['current_wave_enemies'] += SWARM_SIZE
+
+    def create_enemy(self, enemy_type, path_id, count=1):
+        # 按类型取原型属性，生命值和奖励再根据波数增加；count 大于 1 时为一组成员
+        health, speed, reward = ENEMY_PROTOTYPES.get(enemy_type, ENEMY_PROTOTYPES[DEFAULT_ENEMY_TYPE])
+        wave_multiplier = 1 + (self.state['current_wave'] - 1) * 0.15
+        health *= wave_multiplier
+        reward *= wave_multiplier
+        return self.enemy_pool.acquire(self.next_entity_id(), enemy_type, path_id, health, speed, reward, count)
+
+    def detach_member(self, group):
+        # 从组中拆出最前面的成员作为单独的敌人，用于只作用于单个成员的冰冻和中毒；不是组时返回敌人本身
+        # 新敌人在本帧的空间索引中不存在，下一帧起才会被溅射伤害和目标搜索找到
+        if group.count <= 1:
+            return group
+        member = self.enemy_pool.acquire(self.next_entity_id(), group.type, group.path_id, group.max_health,
+                                         group.speed, group.reward)
+        member.health = group.health
+        member.progress = group.progress
+        member.path_index = group.path_index
+        member.x = group.x
+        member.y = group.y
+        group.count -= 1
+        group.health = group.member_health
+        self.health_changed(group)
+        return self.add_enemy(member)
+
+    def add_enemy(self, enemy):
+        # 加入敌人并安排周期行为：治疗者在出现的这一帧第一次治疗，隐身敌人经过一个阶段后第一次隐身
+        # 数组存储模式按到期帧号批量检查，不使用时间轮
+        # 返回加入存储后的敌人（数组存储模式下为视图）
+        tick = self.state['tick']
+        if enemy.type == 'HEALER':
+            enemy.heal_at = tick
+        elif enemy.type == 'STEALTH':
+            enemy.stealth_at = tick + STEALTH_PHASE_TICKS
+        stored = self.state['enemies'].append(enemy)
+        if self.uses_enemy_arrays():
+            # 字段已复制到数组中，敌人对象可以立即回收
+            self.enemy_pool.release(enemy)
+        elif enemy.type == 'HEALER':
+            self.timers.schedule(enemy.heal_at, 'heal', enemy.id)
+        elif enemy.type == 'STEALTH':
+            self.timers.schedule(enemy.stealth_at, 'stealth', enemy.id)
+        return stored
+
+    def apply_slow(self, enemy):
+        # 减速从下一帧开始持续 ICE_SLOW_TICKS 帧，再次命中时重新计时，之前安排的解除定时器随之作废
+        enemy.frozen = True
+        enemy.frozen_until = self.state['tick'] + 1 + ICE_SLOW_TICKS
+        if not self.uses_enemy_arrays():
+            self.timers.schedule(enemy.frozen_until, 'unfreeze', enemy.id)
+
+    def apply_poison(self, enemy, damage):
+        # 从下一帧开始每帧掉血，已经中毒时只刷新持续时间和伤害，沿用已安排的定时器
+        if not enemy.poisoned and not self.uses_enemy_arrays():
+            self.timers.schedule(self.state['tick'] + 1, 'poison', enemy.id)
+        enemy.poisoned = True
+        enemy.poison_duration = POISON_TICKS
+        enemy.poison_damage = damage
+
+    def process_timers(self):
+        # 处理本帧到期的定时器，返回本帧治疗的治疗者
+        game_state = self.state
+        tick = game_state['tick']
+        enemies = game_state['enemies']
+        healers = []
+        for kind, entity_id in self.timers.advance(tick):
+            if kind == 'reload':
+                tower = game_state['towers'].get(entity_id)
+                if tower is not None:
+                    self.idle_towers[entity_id] = tower
+                continue
+            # 敌人已被消灭或到达终点时定时器直接作废
+            enemy = enemies.get(entity_id)
+            if enemy is None:
+                continue
+            if kind == 'unfreeze':
+                if enemy.frozen_until <= tick:
+                    enemy.frozen = False
+            elif kind == 'poison':
+                enemy.health -= enemy.poison_damage
+                enemy.poison_duration -= 1
+                if enemy.poison_duration <= 0:
+                    enemy.poisoned = False
+                else:
+                    self.timers.schedule(tick + 1, 'poison', entity_id)
+            elif kind == 'heal':
+                healers.append(enemy)
+                enemy.heal_at = tick + HEAL_INTERVAL
+                self.timers.schedule(enemy.heal_at, 'heal', entity_id)
+            elif kind == 'stealth':
+                enemy.stealth = not enemy.stealth
+                enemy.stealth_at = tick + STEALTH_PHASE_TICKS
+                self.timers.schedule(enemy.stealth_at, 'stealth', entity_id)
+        return healers
+
+    def uses_enemy_arrays(self):
+        return EnemyArrays is not None and isinstance(self.state['enemies'], EnemyArrays)
+
+    def update_enemies(self):
+        game_state = self.state
+        healers = self.process_timers()
+        if self.uses_enemy_arrays():
+            leaked = game_state['enemies'].update(game_state['tick'])
+            if leaked:
+                game_state['lives'] -= leaked
+                self.event_totals['leaks'] += leaked
+                if game_state['lives'] <= 0:
+                    game_state['is_running'] = False
+            return
+
+        # 遍历期间不删除敌人，到达终点的敌人在遍历结束后统一移除，不需要复制敌人列表
+        enemies = game_state['enemies']
+        leaked = []
+
+        # 本帧到期的治疗者一次性结算，得到每个敌人的治疗量
+        if healers:
+            default_heal, heals = self.heal_auras(healers, enemies)
+
+        for enemy in enemies:
+            # 处理治疗者光环
+            if healers:
+                heal = heals.get(enemy.id, default_heal)
+                if heal and enemy.health < enemy.max_health:
+                    enemy.health = min(enemy.max_health, enemy.health + heal)
+                if heal and enemy.count > 1 and enemy.member_health < enemy.max_health:
+                    enemy.member_health = min(enemy.max_health, enemy.member_health + heal)
+
+            # 沿路径前进：只累加走过的距离，坐标由累计弧长插值得到，一帧可以跨过多个路径点
+            path = PATH_REGISTRY[enemy.path_id]
+            if enemy.progress < path['length']:
+                speed = enemy.speed * ICE_SLOW_FACTOR if enemy.frozen else enemy.speed
+                enemy.progress += speed * (1.0 + self.rng.uniform(-0.1, 0.1))
+                enemy.path_index, enemy.x, enemy.y = locate_on_path(path, enemy.progress, enemy.path_index)
+            else:
+                leaked.append(enemy)
+
+        for enemy in leaked:
+            game_state['lives'] -= enemy.count
+            self.event_totals['leaks'] += enemy.count
+            enemies.remove(enemy)
+            self.enemy_pool.release(enemy)
+            if game_state['lives'] <= 0:
+                game_state['is_running'] = False
+
+    def heal_auras(self, healers, enemies):
+        # 返回 (默认治疗量, 敌人ID -> 治疗量)；每个到期的治疗者为光环内除自己以外的敌人恢复 10 点生命
+        # 治疗全场时所有敌人的治疗量相同，只需记录治疗者自己少得的一份
+        if not self.heal_radius:
+            default_heal = 10 * len(healers)
+            return default_heal, {healer.id: default_heal - 10 for healer in healers}
+
+        # 光环有半径时用空间索引查找每个治疗者附近的敌人（此时敌人尚未移动，位置为上一帧结束时）
+        self.enemy_index.rebuild(enemies)
+        heals = {}
+        for healer in healers:
+            for enemy in self.enemy_index.query_radius(healer.x, healer.y, self.heal_radius):
+                if enemy is not healer:
+                    heals[enemy.id] = heals.get(enemy.id, 0) + 10
+        return 0, heals
+
+    def damage_enemy(self, enemy, damage, splash=False):
+        # 造成伤害，敌人被消灭并移除时返回 True
+        # 对一组集群敌人，单体攻击只打中最前面的成员，溅射伤害打中所有成员；每个死亡的成员单独计算奖励，
+        # 最后一个成员死亡时才移除整组
+        enemy.health -= damage
+        if enemy.count > 1:
+            if splash:
+                enemy.member_health -= damage
+            while enemy.count > 1 and enemy.health <= 0:
+                self.reward_kill(enemy)
+                enemy.count -= 1
+                enemy.health = enemy.member_health
+        if enemy.health <= 0:
+            self.kill_enemy(enemy)
+            return True
+        self.health_changed(enemy)
+        return False
+
+    def health_changed(self, enemy):
+        # 本帧的路径位置索引已建立时同步更新其中的血量视图
+        if self.progress_index_tick == self.state['tick']:
+            self.progress_index.update_health(enemy)
+
+    def reward_kill(self, enemy):
+        game_state = self.state
+        game_state['money'] += enemy.reward
+        game_state['score'] += enemy.reward
+        self.event_totals['kills'] += 1
+        self.event_totals['rewards'] += enemy.reward
+
+    def kill_enemy(self, enemy):
+        game_state = self.state
+        self.reward_kill(enemy)
+        # 先从索引中删除：数组存储模式下敌人被移除后视图不再指向有效的行
+        self.enemy_index.remove(enemy)
+        if self.progress_index_tick == game_state['tick']:
+            self.progress_index.remove(enemy)
+        game_state['enemies'].remove(enemy)
+        if not self.uses_enemy_arrays():
+            self.enemy_pool.release(enemy)
+
+    def update_towers(self):
+        game_state = self.state
+        enemies = game_state['enemies']
+        enemy_index = self.enemy_index
+
+        # 敌人在塔的更新阶段不会移动，每帧重建一次索引即可
+        if self.uses_enemy_arrays():
+            enemy_index.rebuild(*enemies.index_columns())
+        else:
+            enemy_index.rebuild(enemies)
+
+        # 本帧允许的目标搜索次数：重放时来自录像，否则在时间预算用完时截断
+        tick = game_state['tick']
+        bucket = tick % RETARGET_BUCKETS
+        limit = self.retarget_limits.pop(tick, None)
+        deadline = self.tick_deadline
+        deferred_retargets = self.deferred_retargets
+        searches = 0
+        deferred = 0
+
+        # 只检查已装填的塔，装填中的塔由定时器在装填完成时放回；上一帧被推迟的塔排在最前面，先于其他塔搜索
+        towers = list(self.idle_towers.values())
+        if deferred_retargets:
+            towers.sort(key=lambda tower: tower.id not in deferred_retargets)
+        for tower in towers:
+            # 塔按ID引用目标；nearest 策略保持目标直到其被移除，其他策略每次攻击前重新选择
+            target = None if tower.target is None else enemies.get(tower.target)
+            retarget = target is None or tower.strategy != 'nearest'
+            if retarget and tower.id % RETARGET_BUCKETS != bucket and tower.id not in deferred_retargets:
+                # 不在本帧的分组中：有目标时继续攻击原目标，否则等到轮到自己
+                if target is None:
+                    continue
+                retarget = False
+            if retarget:
+                if limit is not None:
+                    over_budget = searches >= limit
+                else:
+                    over_budget = (deadline is not None and searches >= MIN_RETARGETS_PER_TICK
+                                   and time.perf_counter() >= deadline)
+                if over_budget:
+                    deferred += 1
+                    deferred_retargets.add(tower.id)
+                    if target is None:
+                        continue
+                else:
+                    searches += 1
+                    deferred_retargets.discard(tower.id)
+                    target = self.acquire_target(tower)
+                    tower.target = None if target is None else target.id
+
+            # 攻击目标
+            if target is not None:
+                dx = target.x - tower.x
+                dy = target.y - tower.y
+                distance = math.sqrt(dx * dx + dy * dy)
+
+                if distance <= tower.range:
+                    if tower.type == 'CANNON':
+                        # 溅射伤害：塔周围1格内的所有敌人
+                        for enemy in enemy_index.query_radius(tower.x, tower.y, 1):
+                            self.damage_enemy(enemy, tower.damage, splash=True)
+                    else:
+                        damage = tower.damage
+                        if tower.type == 'SNIPER':
+                            damage *= 2 if self.rng.random() < 0.3 else 1
+                        elif tower.type == 'ICE' or tower.type == 'POISON':
+                            # 冰冻和中毒只作用于被打中的成员，先把它从组中拆出，塔继续以它为目标
+                            target = self.detach_member(target)
+                            tower.target = target.id
+                            if tower.type == 'ICE':
+                                self.apply_slow(target)
+                            else:
+                                self.apply_poison(target, tower.damage)
+                        if self.damage_enemy(target, damage):
+                            tower.target = None
+
+                    # 攻击后隔 attack_speed 帧才能再次攻击
+                    del self.idle_towers[tower.id]
+                    self.timers.schedule(tick + tower.attack_speed + 1, 'reload', tower.id)
+
+        self.retarget_totals['searches'] += searches
+        if deferred:
+            self.retarget_totals['deferred'] += deferred
+            if limit is None:
+                self.log_retarget_limit(tick, searches)
+
+    def log_retarget_limit(self, tick, limit):
+        # 紧接着上一条截断记录且次数相同时只延长该记录覆盖的帧数
+        last = self.input_log[-1] if self.input_log else None
+        if (last is not None and last['command'] == 'retarget_limit' and last['limit'] == limit
+                and last['tick'] + last['ticks'] == tick):
+            last['ticks'] += 1
+        else:
+            self.input_log.append({'tick': tick, 'command': 'retarget_limit', 'limit': limit, 'ticks': 1})
+
+    def acquire_target(self, tower):
+        # 按塔的攻击策略寻找射程内的目标，只有狙击塔能看到隐身敌人
+        include_hidden = tower.type == 'SNIPER'
+        if tower.strategy == 'nearest':
+            return self.enemy_index.nearest(tower.x, tower.y, tower.range, include_hidden)
+        # 路径位置索引在本帧第一次用到时刷新
+        game_state = self.state
+        if self.progress_index_tick != game_state['tick']:
+            enemies = game_state['enemies']
+            if self.uses_enemy_arrays():
+                self.progress_index.refresh(*enemies.progress_columns(), health_of=enemies.health_of)
+            else:
+                self.progress_index.refresh(enemies, positions=enemies.positions)
+            self.progress_index_tick = game_state['tick']
+        return self.progress_index.select(self.tower_coverage[tower.id], tower.strategy, include_hidden)
+
+    def is_valid_position(self, x, y):
+        # 塔只能放在整数格子上
+        if not isinstance(x, int) or not isinstance(y, int):
+            return False
+
+        # 检查是否在网格范围内
+        if not (0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT):
+            return False
+
+        # 路径和已有的塔都记录在占用网格中
+        return self.occupancy_grid[y * GRID_WIDTH + x] == CELL_FREE
+
+    def set_cell(self, x, y, value):
+        self.occupancy_grid[y * GRID_WIDTH + x] = value
+
+def locate_on_path(path, progress, index=0):
+    # 从缓存的线段下标开始向后查找 progress 所在的线段，返回 (线段下标, x, y)
+    # 敌人只会前进，平均每帧最多前移一个线段；走完全程时停在终点，下标为最后一个路径点
+    points = path['points']
+    if progress >= path['length']:
+        x, y = points[-1]
+        return len(points) - 1, x, y
+    cumulative = path['cumulative_lengths']
+    while cumulative[index + 1] <= progress:
+        index += 1
+    x0, y0 = points[index]
+    x1, y1 = points[index + 1]
+    t = (progress - cumulative[index]) / path['segment_lengths'][index]
+    return index, x0 + (x1 - x0) * t, y0 + (y1 - y0) * t
+
+def place_on_path(enemy, progress):
+    enemy.progress = progress
+    enemy.path_index, enemy.x, enemy.y = locate_on_path(PATH_REGISTRY[enemy.path_id], progress)
+
+def path_coverage(x, y, radius):
+    # 计算圆形射程覆盖的路径区间，返回 (路径ID, 起点距离, 终点距离, 路径总长) 列表
+    # 每条线段与圆求交，相邻线段的区间合并；区间包含终点时延伸到无穷远，包括停在终点等待离开的敌人
+    coverage = []
+    for path_id, path in PATH_REGISTRY.items():
+        points = path['points']
+        cumulative = path['cumulative_lengths']
+        intervals = []
+        for i, segment_length in enumerate(path['segment_lengths']):
+            x0, y0 = points[i]
+            x1, y1 = points[i + 1]
+            # 圆心在线段方向上的投影位置和到线段所在直线的距离
+            along = ((x - x0) * (x1 - x0) + (y - y0) * (y1 - y0)) / segment_length
+            offset_squared = (x - x0) ** 2 + (y - y0) ** 2 - along * along
+            if offset_squared > radius * radius:
+                continue
+            half_chord = math.sqrt(radius * radius - offset_squared)
+            low = max(0.0, along - half_chord)
+            high = min(segment_length, along + half_chord)
+            if low > high:
+                continue
+            low += cumulative[i]
+            high += cumulative[i]
+            if intervals and low <= intervals[-1][1]:
+                intervals[-1][1] = max(intervals[-1][1], high)
+            else:
+                intervals.append([low, high])
+        for low, high in intervals:
+            if high >= path['length']:
+                high = float('inf')
+            coverage.append((path_id, low, high, path['length']))
+    return coverage
+
+def in_support_range(support, tower):
+    dx = tower.x - support.x
+    dy = tower.y - support.y
+    return math.sqrt(dx * dx + dy * dy) <= support.range
+
+def get_tower_cost(tower_type):
+    return tower_prototype(tower_type)[3]
+
+def build_path_grid():
+    grid = bytearray(GRID_WIDTH * GRID_HEIGHT)
+    for path in PATH_REGISTRY.values():
+        for px, py in path['points']:
+            grid[py * GRID_WIDTH + px] = CELL_PATH
+    return bytes(grid)
+
+def build_paths():
+    paths = []
+    
+    # 第一条路径（左上到右中）
+    path1 = []
+    path1.append((0, 4))
+    for x in range(1, 12):
+        path1.append((x, 4))
+    for y in range(5, 8):
+        path1.append((11, y))
+    for x in range(10, -1, -1):
+        path1.append((x, 7))
+    for y in range(6, 3, -1):
+        path1.append((0, y))
+    for x in range(1, 20):
+        path1.append((x, 4))
+    paths.append(path1)
+    
+    # 第二条路径（左下到右上）
+    path2 = []
+    path2.append((0, 12))
+    for x in range(1, 15):
+        path2.append((x, 12))
+    for y in range(11, 8, -1):
+        path2.append((14, y))
+    for x in range(15, 25):
+        path2.append((x, 9))
+    for y in range(10, 13):
+        path2.append((24, y))
+    for x in range(23, 18, -1):
+        path2.append((x, 12))
+    paths.append(path2)
+    
+    # 第三条路径（右边到中间）
+    path3 = []
+    path3.append((34, 8))
+    for x in range(33, 28, -1):
+        path3.append((x, 8))
+    for y in range(9, 15):
+        path3.append((28, y))
+    for x in range(29, 32):
+        path3.append((x, 14))
+    paths.append(path3)
+    
+    # 第四条路径（右边到左下）
+    path4 = []
+    path4.append((34, 16))
+    for x in range(33, 28, -1):
+        path4.append((x, 16))
+    for y in range(15, 12, -1):
+        path4.append((28, y))
+    for x in range(27, 22, -1):
+        path4.append((x, 12))
+    paths.append(path4)
+    
+    # 第五条路径（上方到中间）
+    path5 = []
+    path5.append((17, 0))
+    for y in range(1, 6):
+        path5.append((17, y))
+    for x in range(16, 13, -1):
+        path5.append((x, 5))
+    for y in range(6, 9):
+        path5.append((13, y))
+    for x in range(14, 17):
+        path5.append((x, 8))
+    paths.append(path5)
+    
+    # 第六条路径（左上方到右下方）
+    path6 = []
+    path6.append((0, 0))
+    for x in range(1, 8):
+        path6.append((x, x))
+    for x in range(8, 15):
+        path6.append((x, 7))
+    for y in range(8, 15):
+        path6.append((14, y))
+    for x in range(15, 22):
+        path6.append((x, 14))
+    paths.append(path6)
+    
+    # 第七条路径（右上方到左下方）
+    path7 = []
+    path7.append((34, 0))
+    for x in range(33, 26, -1):
+        path7.append((x, 34-x))
+    for x in range(26, 19, -1):
+        path7.append((x, 8))
+    for y in range(9, 16):
+        path7.append((19, y))
+    for x in range(18, 11, -1):
+        path7.append((x, 15))
+    paths.append(path7)
+    
+    return paths
+
+def build_path_registry():
+    # 路径只在启动时构建一次，保存不可变的路径点、每段长度和累计弧长
+    registry = {}
+    for path_id, points in enumerate(build_paths()):
+        points = tuple(points)
+        segment_lengths = tuple(math.dist(a, b) for a, b in zip(points, points[1:]))
+        cumulative_lengths = [0.0]
+        for length in segment_lengths:
+            cumulative_lengths.append(cumulative_lengths[-1] + length)
+        registry[path_id] = {
+            'id': path_id,
+            'points': points,
+            'segment_lengths': segment_lengths,
+            'cumulative_lengths': tuple(cumulative_lengths),
+            'length': cumulative_lengths[-1]
+        }
+    return registry
+
+def replay(recording, until_tick=None, until_wave=None, max_ticks=None, enemy_store_mode=None):
+    # 按录像重新运行一局游戏：用同一种子创建引擎，在记录的帧号上重新应用玩家输入
+    # 输入记录中的 retarget_limit 不是玩家输入，而是超出时间预算的帧的目标搜索次数：
+    # {'tick': 起始帧, 'limit': 每帧次数, 'ticks': 连续帧数}，在起始帧应用时为这几帧一起设置截断次数
+    # 可以在指定帧或波次停下，全速快进到需要分析的局面
+    if recording.get('version') != RECORDING_VERSION:
+        raise ValueError('不支持的录像版本: %r' % (recording.get('version'),))
+    engine = GameEngine(enemy_store_mode or recording.get('enemy_store', ENEMY_STORE_MODE), recording['seed'],
+                        recording.get('heal_radius', 0), swarm_lod=recording.get('swarm_lod', False))
+    state = engine.state
+    inputs = recording['inputs']
+    if until_tick is None and until_wave is None:
+        until_tick = recording['tick']
+    next_input = 0
+    while True:
+        while next_input < len(inputs) and inputs[next_input]['tick'] <= state['tick']:
+            engine.apply_input(inputs[next_input])
+            next_input += 1
+        if not state['is_running']:
+            break
+        if until_tick is not None and state['tick'] >= until_tick:
+            break
+        if until_wave is not None and state['current_wave'] >= until_wave:
+            break
+        if max_ticks is not None and state['tick'] >= max_ticks:
+            break
+        engine.step()
+    return engine
+
+# 路径注册表
+PATH_REGISTRY = build_path_registry()
+PATH_IDS = tuple(PATH_REGISTRY)
+
+# 数组引擎模式使用的填充路径数组
+PATH_ARRAYS = build_path_arrays(PATH_REGISTRY) if EnemyArrays is not None else None
+
+# 占用网格：路径部分启动时构建一次，每局游戏复制一份并在放置塔时更新
+PATH_GRID = build_path_grid()
@@ -0,0 +1,107 @@
+# 游戏实体：敌人和塔使用固定字段的 __slots__ 类，比每个实体一个字典更省内存、字段访问更快
+# 与类型有关的属性集中在按类型共享的原型表中
+
+BASE_ENEMY_HEALTH = 100
+BASE_ENEMY_SPEED = 0.05
+BASE_ENEMY_REWARD = 10
+
+# 敌人原型：类型 -> (生命值, 速度, 奖励)，生命值和奖励还会按波数增加
+ENEMY_PROTOTYPES = {
+    'NORMAL': (BASE_ENEMY_HEALTH, BASE_ENEMY_SPEED, BASE_ENEMY_REWARD),
+    'FAST': (BASE_ENEMY_HEALTH * 0.7, BASE_ENEMY_SPEED * 1.5, BASE_ENEMY_REWARD * 1.2),
+    'TANK': (BASE_ENEMY_HEALTH * 2.5, BASE_ENEMY_SPEED * 0.7, BASE_ENEMY_REWARD * 1.5),
+    'BOSS': (BASE_ENEMY_HEALTH * 5, BASE_ENEMY_SPEED * 0.8, BASE_ENEMY_REWARD * 3),
+    'FLYING': (BASE_ENEMY_HEALTH * 1.2, BASE_ENEMY_SPEED * 1.2, BASE_ENEMY_REWARD * 1.3),
+    'STEALTH': (BASE_ENEMY_HEALTH * 1.5, BASE_ENEMY_SPEED * 1.1, BASE_ENEMY_REWARD * 1.4),
+    'HEALER': (BASE_ENEMY_HEALTH * 1.8, BASE_ENEMY_SPEED * 0.9, BASE_ENEMY_REWARD * 1.6),
+    'SWARM': (BASE_ENEMY_HEALTH * 0.5, BASE_ENEMY_SPEED * 1.3, BASE_ENEMY_REWARD * 0.8)
+}
+DEFAULT_ENEMY_TYPE = 'SWARM'
+
+# 敌人类型与整数编码的对应关系，按原型表的顺序编号；数组存储和二进制帧共用
+ENEMY_TYPE_NAMES = tuple(ENEMY_PROTOTYPES)
+ENEMY_TYPE_CODES = {name: code for code, name in enumerate(ENEMY_TYPE_NAMES)}
+
+# 塔原型：类型 -> (伤害, 攻击间隔, 射程, 价格)；未知类型按箭塔处理
+TOWER_PROTOTYPES = {
+    'ARROW': (30, 20, 3, 100),
+    'CANNON': (75, 30, 2, 200),
+    'MAGIC': (25, 15, 3, 150),
+    'LASER': (45, 25, 4, 250),
+    'ICE': (15, 27, 3, 175),
+    'POISON': (20, 20, 3, 225),
+    'SNIPER': (100, 40, 5, 300),
+    'SUPPORT': (0, 0, 3, 275)
+}
+DEFAULT_TOWER_TYPE = 'ARROW'
+
+# 塔的攻击策略：最近、最靠近终点、最远离终点、血量最多、血量最少
+TARGETING_STRATEGIES = ('nearest', 'first', 'last', 'strongest', 'weakest')
+DEFAULT_TARGETING = 'nearest'
+
+# 状态效果和周期行为的持续帧数
+ICE_SLOW_FACTOR = 0.5       # 冰冻塔减速后的速度倍数
+ICE_SLOW_TICKS = 60         # 减速持续的帧数，再次命中时重新计时
+POISON_TICKS = 5            # 中毒后持续掉血的帧数
+HEAL_INTERVAL = 60          # 治疗者两次治疗之间的帧数
+STEALTH_PHASE_TICKS = 30    # 隐身敌人每隔多少帧切换一次隐身状态
+
+def tower_prototype(tower_type):
+    return TOWER_PROTOTYPES.get(tower_type, TOWER_PROTOTYPES[DEFAULT_TOWER_TYPE])
+
+class Enemy:
+    # progress 为沿路径走过的距离，path_index 为所在线段的起点下标，x、y 由二者插值得到
+    # *_until / *_at 为状态结束或下一次触发的帧号
+    # count 大于 1 时为一组同时移动的集群敌人：health 为最前面成员的生命值，member_health 为其余每个成员的生命值，
+    # max_health、speed、reward 均为单个成员的属性
+    __slots__ = ('id', 'type', 'x', 'y', 'health', 'max_health', 'speed', 'reward',
+                 'path_id', 'path_index', 'progress', 'frozen', 'frozen_until', 'poisoned',
+                 'poison_duration', 'poison_damage', 'stealth', 'stealth_at', 'heal_at',
+                 'count', 'member_health')
+
+    def __init__(self, entity_id, enemy_type, path_id, health, speed, reward, count=1):
+        self.reset(entity_id, enemy_type, path_id, health, speed, reward, count)
+
+    def reset(self, entity_id, enemy_type, path_id, health, speed, reward, count=1):
+        # 重置全部字段，对象池复用敌人对象时调用
+        self.id = entity_id
+        self.type = enemy_type
+        self.x = 0.0
+        self.y = 0.0
+        self.health = health
+        self.max_health = health
+        self.speed = speed
+        self.reward = reward
+        self.path_id = path_id
+        self.path_index = 0
+        self.progress = 0.0
+        self.frozen = False
+        self.frozen_until = 0
+        self.poisoned = False
+        self.poison_duration = 0
+        self.poison_damage = 0
+        self.stealth = False
+        self.stealth_at = 0
+        self.heal_at = 0
+        self.count = count
+        self.member_health = health
+
+class Tower:
+    __slots__ = ('id', 'type', 'x', 'y', 'level', 'target', 'strategy', 'base_damage',
+                 'damage_multiplier', 'damage', 'attack_speed', 'range')
+
+    def __init__(self, entity_id, tower_type, x, y, strategy=DEFAULT_TARGETING):
+        damage, attack_speed, tower_range, _ = tower_prototype(tower_type)
+        self.id = entity_id
+        self.type = tower_type
+        self.x = x
+        self.y = y
+        self.level = 1
+        self.target = None
+        self.strategy = strategy
+        # 实际伤害为基础伤害乘以支援塔增益的倍数
+        self.base_damage = damage
+        self.damage_multiplier = 1.0
+        self.damage = damage
+        self.attack_speed = attack_speed
+        self.range = tower_range
@@ -0,0 +1,36 @@
+class EntityTable:
+    # 按实体ID索引的紧凑存储：实体保存在连续的列表中，另有 ID 到位置的映射
+    # 删除时用末尾的实体填补空位，查找、判断存在和删除都是 O(1)，但不保持插入顺序
+    def __init__(self, entities=()):
+        self.items = []
+        self.positions = {}
+        for entity in entities:
+            self.append(entity)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.positions
+
+    def get(self, entity_id):
+        position = self.positions.get(entity_id)
+        return None if position is None else self.items[position]
+
+    def append(self, entity):
+        entity_id = entity.id
+        if entity_id in self.positions:
+            raise ValueError('实体ID重复: %r' % (entity_id,))
+        self.positions[entity_id] = len(self.items)
+        self.items.append(entity)
+        return entity
+
+    def remove(self, entity):
+        position = self.positions.pop(entity.id)
+        last = self.items.pop()
+        if last is not entity:
+            self.items[position] = last
+            self.positions[last.id] = position
@@ -0,0 +1,283 @@
+import argparse
+import http.client
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmark import percentile
+
+# 负载测试：模拟大量浏览器客户端并发访问，逐级增加玩家数量，
+# 统计每一级的吞吐量、各接口的延迟分位数和错误率
+#
+#   python loadtest.py --concurrency 1,10,50,100 --step-duration 10
+#   python loadtest.py --target http://127.0.0.1:5000 --concurrency 10,50,200
+#
+# 默认在本进程内通过 Flask 测试客户端驱动 app（客户端和服务器共享同一个解释器），
+# 指定 --target 时通过 HTTP 访问本机已启动的服务器。
+# 每个玩家按真实客户端的方式运行：开始游戏、读取占用网格、每隔一段时间连续放置几座塔，
+# 其余时间持续轮询 /update_game，同一时间最多一个轮询请求。
+
+DEFAULT_CONCURRENCY = '1,10,25,50'
+FRAME_BUDGET_MS = 1000 / 60
+CHEAP_TOWERS = ('ARROW', 'ARROW', 'MAGIC', 'CANNON')
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+class HttpTransport:
+    # 每个玩家一个保持连接的 HTTP 连接
+    def __init__(self, base_url, timeout=10):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+class Recorder:
+    # 线程安全的请求结果收集，每一级结束时取出并清空
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, latency, outcome):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append((latency, outcome))
+
+    def drain(self):
+        with self.lock:
+            samples = self.samples
+            self.samples = {}
+        return samples
+
+class Player(threading.Thread):
+    def __init__(self, player_id, transport_factory, recorder, options, stop_event):
+        super().__init__(name='player-%d' % player_id, daemon=True)
+        self.player_id = player_id
+        self.transport_factory = transport_factory
+        self.recorder = recorder
+        self.options = options
+        self.stop_event = stop_event
+        self.rng = random.Random(options.seed * 100003 + player_id)
+
+    def call(self, endpoint, method, path, body=None):
+        # 返回响应 JSON；状态码不是 200 或请求异常时记为错误，业务上拒绝（如金钱不足）单独计数
+        start = time.perf_counter()
+        try:
+            status, data = self.transport.request(method, path, body)
+        except Exception:
+            self.recorder.record(endpoint, time.perf_counter() - start, 'error')
+            return None
+        latency = time.perf_counter() - start
+        if status != 200 or data is None:
+            outcome = 'error'
+        elif data.get('status') == 'error':
+            outcome = 'rejected'
+        else:
+            outcome = 'ok'
+        self.recorder.record(endpoint, latency, outcome)
+        return data if outcome != 'error' else None
+
+    def run(self):
+        self.transport = self.transport_factory()
+        try:
+            while not self.stop_event.is_set():
+                self.play_game()
+        finally:
+            self.transport.close()
+
+    def play_game(self):
+        options = self.options
+        data = self.call('start_game', 'GET', '/start_game')
+        if not data or data.get('status') != 'success':
+            self.stop_event.wait(1.0)
+            return
+        game_id = data['game_id']
+        occupancy = self.call('occupancy', 'GET', '/occupancy?game_id=' + game_id)
+        free_cells = []
+        if occupancy:
+            width = occupancy['width']
+            free_cells = [(i % width, i // width) for i, cell in enumerate(occupancy['cells']) if cell == '0']
+            self.rng.shuffle(free_cells)
+
+        client_id = 'load-%d' % self.player_id
+        ack = None
+        next_burst = time.monotonic()
+        next_poll = time.monotonic()
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_burst and free_cells:
+                for _ in range(min(options.burst_size, len(free_cells))):
+                    x, y = free_cells.pop()
+                    self.call('place_tower', 'POST', '/place_tower', {
+                        'game_id': game_id, 'type': self.rng.choice(CHEAP_TOWERS), 'x': x, 'y': y
+                    })
+                next_burst = now + options.burst_every
+
+            frame = self.call('update_game', 'POST', '/update_game', {
+                'game_id': game_id, 'client_id': client_id, 'ack': ack, 'keyframe': ack is None
+            })
+            if frame is not None:
+                if frame.get('status') == 'error':
+                    return
+                ack = frame['tick']
+                if frame['state'].get('is_running') is False:
+                    return
+
+            # 与浏览器的 requestAnimationFrame 一样，上一个请求返回后等到下一帧再发
+            next_poll = max(next_poll + options.poll_interval, time.monotonic())
+            self.stop_event.wait(max(0.0, next_poll - time.monotonic()))
+
+def describe(samples, elapsed):
+    latencies = [latency * 1000 for latency, _ in samples]
+    errors = sum(1 for _, outcome in samples if outcome == 'error')
+    return {
+        'requests': len(samples),
+        'throughput_rps': len(samples) / elapsed,
+        'errors': errors,
+        'rejected': sum(1 for _, outcome in samples if outcome == 'rejected'),
+        'error_rate': errors / len(samples),
+        'p50_ms': percentile(latencies, 0.5),
+        'p90_ms': percentile(latencies, 0.9),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': max(latencies)
+    }
+
+def run_step(players, concurrency, transport_factory, recorder, options, stop_event):
+    # 补足本级需要的玩家数量（之前的玩家继续运行），预热后统计一个完整的时长
+    while len(players) < concurrency:
+        player = Player(len(players), transport_factory, recorder, options, stop_event)
+        players.append(player)
+        player.start()
+    time.sleep(options.warmup)
+    recorder.drain()
+    start = time.perf_counter()
+    time.sleep(options.step_duration)
+    samples = recorder.drain()
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in samples.values())
+    step = {
+        'concurrency': concurrency,
+        'duration_s': elapsed,
+        'requests': total,
+        'throughput_rps': total / elapsed,
+        'endpoints': {endpoint: describe(values, elapsed) for endpoint, values in sorted(samples.items())}
+    }
+    update = step['endpoints'].get('update_game')
+    step['within_budget'] = (update is not None and update['p99_ms'] <= options.frame_budget_ms
+                             and update['error_rate'] <= options.max_error_rate)
+    return step
+
+def make_transport_factory(target):
+    if target is None:
+        # 进程内模式：导入 app 会按当前环境变量配置服务器（如 TOWER_DEFENSE_TICK_RATE）
+        from app import app
+        return lambda: TestClientTransport(app)
+    return lambda: HttpTransport(target)
+
+def parse_concurrency(text):
+    levels = [int(value) for value in text.split(',') if value.strip()]
+    if not levels or any(level < 1 for level in levels) or levels != sorted(levels):
+        raise argparse.ArgumentTypeError('并发级别必须是递增的正整数列表，例如 1,10,50')
+    return levels
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='模拟多个浏览器客户端，逐级增加并发测试服务器的承载能力')
+    parser.add_argument('--target', help='服务器地址，例如 http://127.0.0.1:5000；默认在本进程内通过测试客户端运行')
+    parser.add_argument('--concurrency', type=parse_concurrency, default=parse_concurrency(DEFAULT_CONCURRENCY),
+                        help='逐级增加的并发玩家数，逗号分隔')
+    parser.add_argument('--step-duration', type=float, default=10.0, help='每一级统计的时长（秒）')
+    parser.add_argument('--warmup', type=float, default=2.0, help='每一级开始统计前的预热时长（秒）')
+    parser.add_argument('--poll-interval', type=float, default=1 / 60, help='轮询 /update_game 的间隔（秒）')
+    parser.add_argument('--burst-size', type=int, default=3, help='每次连续放置的塔数量')
+    parser.add_argument('--burst-every', type=float, default=5.0, help='两次放塔之间的间隔（秒）')
+    parser.add_argument('--frame-budget-ms', type=float, default=FRAME_BUDGET_MS,
+                        help='/update_game 的 p99 延迟超过该值即视为超出帧预算')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='允许的最大错误率')
+    parser.add_argument('--seed', type=int, default=0, help='玩家行为的随机种子')
+    parser.add_argument('--output', help='报告输出文件，默认打印到标准输出')
+    args = parser.parse_args(argv)
+
+    transport_factory = make_transport_factory(args.target)
+    recorder = Recorder()
+    stop_event = threading.Event()
+    players = []
+    report = {
+        'meta': {
+            'target': args.target or 'in-process',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'step_duration': args.step_duration,
+            'poll_interval': args.poll_interval,
+            'frame_budget_ms': args.frame_budget_ms
+        },
+        'steps': []
+    }
+    try:
+        for concurrency in args.concurrency:
+            step = run_step(players, concurrency, transport_factory, recorder, args, stop_event)
+            report['steps'].append(step)
+            update = step['endpoints'].get('update_game', {})
+            print('%5d players %8.1f req/s  update_game p50 %7.2f ms  p99 %7.2f ms  errors %5.2f%%  %s' % (
+                concurrency, step['throughput_rps'], update.get('p50_ms', float('nan')),
+                update.get('p99_ms', float('nan')), update.get('error_rate', 0) * 100,
+                'ok' if step['within_budget'] else 'OVER BUDGET'), file=sys.stderr)
+    finally:
+        stop_event.set()
+        for player in players:
+            player.join(timeout=5)
+
+    # 第一次超出预算之前的最高并发级别
+    report['max_concurrency_within_budget'] = None
+    for step in report['steps']:
+        if not step['within_budget']:
+            break
+        report['max_concurrency_within_budget'] = step['concurrency']
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
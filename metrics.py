@@ -0,0 +1,196 @@
+import bisect
+import gc
+import os
+import threading
+import time
+
+# 运行时指标：按阶段统计每帧耗时、请求耗时和响应大小的直方图，以 Prometheus 文本格式导出
+# 关闭时不安装任何包装，模拟循环和请求处理路径上没有额外开销
+METRICS_ENABLED = os.environ.get('TOWER_DEFENSE_METRICS', '1') != '0'
+
+# 直方图各桶的上界（秒 / 字节），另有一个 +Inf 桶
+DURATION_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                    0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# 引擎每帧的阶段，对应 GameEngine 的方法
+ENGINE_PHASES = {
+    'spawn': 'update_waves',
+    'update_enemies': 'update_enemies',
+    'update_towers': 'update_towers'
+}
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        # 值等于上界时计入该桶，与 Prometheus 的 le 语义一致
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def cumulative(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        result = []
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            result.append((bound, running))
+        return result, total
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class MetricsRegistry:
+    # 指标按名称和标签保存，同名同标签的指标在所有游戏间共享
+    # collector 为在导出时调用的函数，返回 (名称, 类型, 说明, [(标签, 值), ...]) 的序列，用于按需读取的量
+    def __init__(self):
+        self.families = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS, **labels):
+        return self._get(name, 'histogram', help_text, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, help_text, **labels):
+        return self._get(name, 'counter', help_text, labels, Counter)
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def _get(self, name, kind, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = (kind, help_text, {})
+            elif family[0] != kind:
+                raise ValueError('指标 %s 已注册为 %s' % (name, family[0]))
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    def render(self):
+        lines = []
+        with self.lock:
+            families = [(name, kind, help_text, list(metrics.items()))
+                        for name, (kind, help_text, metrics) in sorted(self.families.items())]
+        for name, kind, help_text, metrics in families:
+            write_header(lines, name, kind, help_text)
+            for labels, metric in sorted(metrics, key=lambda item: item[0]):
+                if kind == 'histogram':
+                    buckets, total = metric.cumulative()
+                    for bound, count in buckets:
+                        lines.append(format_sample(name + '_bucket', labels + (('le', format_value(bound)),), count))
+                    lines.append(format_sample(name + '_sum', labels, total))
+                    lines.append(format_sample(name + '_count', labels, buckets[-1][1]))
+                else:
+                    lines.append(format_sample(name, labels, metric.value))
+        for collector in self.collectors:
+            for name, kind, help_text, samples in collector():
+                write_header(lines, name, kind, help_text)
+                for labels, value in samples:
+                    lines.append(format_sample(name, tuple(sorted(labels.items())), value))
+        return '\n'.join(lines) + '\n'
+
+def write_header(lines, name, kind, help_text):
+    lines.append('# HELP %s %s' % (name, help_text))
+    lines.append('# TYPE %s %s' % (name, kind))
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def format_sample(name, labels, value):
+    if not labels:
+        return '%s %s' % (name, format_value(value))
+    pairs = ','.join('%s="%s"' % (key, str(label).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for key, label in labels)
+    return '%s{%s} %s' % (name, pairs, format_value(value))
+
+class GcMonitor:
+    # 通过 gc.callbacks 统计每一代垃圾回收的次数和停顿时间，并按线程累计停顿时间，
+    # 一段代码前后的累计值之差即为其执行期间本线程发生的停顿
+    # 回调在垃圾回收期间执行，不能获取可能被当前线程持有的锁，只更新普通的计数
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.pause_seconds = [0.0, 0.0, 0.0]
+        self.local = threading.local()
+        gc.callbacks.append(self.callback)
+
+    def close(self):
+        if self.callback in gc.callbacks:
+            gc.callbacks.remove(self.callback)
+
+    def callback(self, phase, info):
+        if phase == 'start':
+            self.local.start = time.perf_counter()
+            return
+        start = getattr(self.local, 'start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        self.local.start = None
+        self.local.total = self.thread_total() + elapsed
+        generation = info['generation']
+        self.collections[generation] += 1
+        self.pause_seconds[generation] += elapsed
+
+    def thread_total(self):
+        return getattr(self.local, 'total', 0.0)
+
+    def timed(self, function, histogram):
+        # 包装函数，把每次调用期间的垃圾回收停顿时间记入直方图
+        def wrapper(*args, **kwargs):
+            start = self.thread_total()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(self.thread_total() - start)
+        return wrapper
+
+    def collect(self):
+        # 作为 MetricsRegistry 的 collector 使用
+        generations = [{'generation': str(generation)} for generation in range(3)]
+        yield ('tower_defense_gc_collections_total', 'counter', '各代垃圾回收的次数',
+               list(zip(generations, list(self.collections))))
+        yield ('tower_defense_gc_pause_seconds_total', 'counter', '各代垃圾回收的累计停顿时间',
+               list(zip(generations, list(self.pause_seconds))))
+
+def timed(function, histogram):
+    # 包装函数，把每次调用的耗时记入直方图
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+def instrument_engine(engine, registry, gc_monitor=None):
+    # 在实例上包装每帧流程和各阶段方法，step() 内部调用的就是包装后的方法
+    # 指定 gc_monitor 时另外记录每帧期间的垃圾回收停顿时间
+    for phase, method_name in ENGINE_PHASES.items():
+        histogram = registry.histogram('tower_defense_tick_phase_seconds', '每帧各阶段的耗时', phase=phase)
+        setattr(engine, method_name, timed(getattr(engine, method_name), histogram))
+    step = timed(engine.step, registry.histogram('tower_defense_tick_seconds', '每帧模拟的总耗时'))
+    if gc_monitor is not None:
+        step = gc_monitor.timed(step, registry.histogram('tower_defense_tick_gc_seconds', '每帧模拟期间垃圾回收的停顿时间'))
+    engine.step = step
@@ -0,0 +1,26 @@
+class ObjectPool:
+    # 可回收对象的池：取出时优先复用已归还的对象并调用其 reset() 原地重置，池空时才用 factory 新建
+    # 归还的对象超过 limit 个时直接丢弃，交给垃圾回收；hits / misses 为复用和新建的次数
+    # 归还后调用方不应再持有该对象的引用
+    def __init__(self, factory, limit=1024):
+        self.factory = factory
+        self.limit = limit
+        self.free = []
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.free)
+
+    def acquire(self, *args):
+        if self.free:
+            item = self.free.pop()
+            item.reset(*args)
+            self.hits += 1
+            return item
+        self.misses += 1
+        return self.factory(*args)
+
+    def release(self, item):
+        if len(self.free) < self.limit:
+            self.free.append(item)
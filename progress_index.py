@@ -0,0 +1,220 @@
+import bisect
+from itertools import compress
+from operator import attrgetter, neg
+
+# 血量视图每块的位置数，查询时中间的整块只比较块内的最大值
+HEALTH_BLOCK = 16
+
+NO_VALUE = float('-inf')
+
+class HealthView:
+    # 按路径位置排列的血量视图：strongest 为血量、weakest 为血量的相反数，统一按最大值查询
+    # 不可选的位置（隐身或已移除）为 -inf；另存每 HEALTH_BLOCK 个位置的最大值
+    def __init__(self, values):
+        self.values = values
+        self.blocks = [max(values[i:i + HEALTH_BLOCK]) for i in range(0, len(values), HEALTH_BLOCK)]
+
+    def set(self, position, value):
+        values = self.values
+        values[position] = value
+        block = position // HEALTH_BLOCK
+        start = block * HEALTH_BLOCK
+        self.blocks[block] = max(values[start:start + HEALTH_BLOCK])
+
+    def best(self, start, end):
+        # 返回 [start, end) 内值最大的位置，相同时取最靠后（最接近终点）的位置；没有可选位置时返回 None
+        values = self.values
+        blocks = self.blocks
+        first_block = start // HEALTH_BLOCK
+        last_block = (end - 1) // HEALTH_BLOCK
+        if first_block == last_block:
+            best = max(values[start:end])
+        else:
+            best = max(max(values[start:(first_block + 1) * HEALTH_BLOCK]),
+                       max(values[last_block * HEALTH_BLOCK:end]),
+                       max(blocks[first_block + 1:last_block], default=NO_VALUE))
+        if best == NO_VALUE:
+            return None
+        for block in range(last_block, first_block - 1, -1):
+            if first_block < block < last_block and blocks[block] != best:
+                continue
+            low = max(start, block * HEALTH_BLOCK)
+            high = min(end, (block + 1) * HEALTH_BLOCK)
+            segment = values[low:high]
+            if best in segment:
+                segment.reverse()
+                return high - 1 - segment.index(best)
+        return None
+
+class PathEntries:
+    # 一条路径上的敌人：order 为敌人在本次刷新的实体列表中的下标，按走过的距离升序排列
+    # 本帧内被移除的敌人只记录其位置，下一次刷新时去掉
+    def __init__(self, order):
+        self.order = order
+        self.removed = set()
+        self.views = {}
+
+class ProgressIndex:
+    # 按路径分组、按走过的距离排序的敌人索引，用于按路径位置和血量选择目标
+    # 塔的射程在每条路径上覆盖若干段距离区间，查询时二分定位区间内的敌人，只检查射程内的敌人
+    #
+    # 索引跨帧保留：每帧第一次使用前刷新，按ID去掉已不在存储中的敌人、追加新出现的敌人，
+    # 再按当前距离重新排序；敌人每帧只前进一小段，上一次的顺序几乎已经有序，排序接近线性
+    # 刷新时缓存每个敌人的ID、距离和隐身状态，查询期间敌人不应移动；
+    # 每个敌人每帧都在移动，刷新仍要读取全部敌人的距离，代价与敌人数量成正比，只是省去了从头分组和排序
+    #
+    # strongest / weakest 使用按路径位置排列的血量视图（见 HealthView），在本帧第一次查询时建立，
+    # 之后由 update_health 和 remove 逐个更新，与实体的当前血量保持一致；
+    # 建立视图用的血量在本帧第一次需要时一次读出，同样由 update_health 更新
+    def __init__(self, hidden_key='stealth'):
+        self.hidden_key = hidden_key
+        self.paths = {}
+        self.entities = []
+        self.ids = []
+        self.progress = []
+        self.hidden = []
+        self.health = None
+        self.health_of = self.read_health
+
+    def read_health(self, entities):
+        return list(map(attrgetter('health'), entities))
+
+    def refresh(self, entities, ids=None, path_ids=None, progress=None, hidden=None, positions=None,
+                health_of=None):
+        # entities 为存储中的全部实体；可以直接传入与之对应的 ID、路径、距离和隐身状态列，避免逐个读取实体字段
+        # positions 为实体ID到其在 entities 中下标的映射，health_of 返回一组实体的当前血量，默认读取实体字段
+        entities = list(entities)
+        if ids is None:
+            ids = list(map(attrgetter('id'), entities))
+            progress = list(map(attrgetter('progress'), entities))
+            hidden = list(map(attrgetter(self.hidden_key), entities))
+        if positions is None:
+            positions = dict(zip(ids, range(len(ids))))
+        previous_ids = self.ids
+
+        # 沿用上一次的顺序，只保留仍在存储中的敌人
+        slots = {}
+        kept = 0
+        for path_id, group in self.paths.items():
+            path_slots = [slot for slot in map(positions.get, map(previous_ids.__getitem__, group.order))
+                          if slot is not None]
+            slots[path_id] = path_slots
+            kept += len(path_slots)
+        if kept < len(entities):
+            # 新出现的敌人按存储顺序追加到所在路径的末尾
+            known = set()
+            for path_slots in slots.values():
+                known.update(map(ids.__getitem__, path_slots))
+            for slot in sorted(map(positions.__getitem__, positions.keys() - known)):
+                path_id = path_ids[slot] if path_ids is not None else entities[slot].path_id
+                path_slots = slots.get(path_id)
+                if path_slots is None:
+                    slots[path_id] = path_slots = []
+                path_slots.append(slot)
+
+        # 按当前距离排序，距离相同时保持原有顺序
+        paths = {}
+        for path_id, path_slots in slots.items():
+            if path_slots:
+                path_slots.sort(key=progress.__getitem__)
+                paths[path_id] = PathEntries(path_slots)
+        self.paths = paths
+        self.entities = entities
+        self.ids = ids
+        self.progress = progress
+        self.hidden = hidden
+        self.health = None
+        self.health_of = health_of or self.read_health
+
+    def locate(self, entity):
+        # 返回 (路径分组, 位置)，不在索引中时返回 (None, None)
+        group = self.paths.get(entity.path_id)
+        if group is None:
+            return None, None
+        order = group.order
+        progress = self.progress
+        entities = self.entities
+        i = bisect.bisect_left(order, entity.progress, key=progress.__getitem__)
+        while i < len(order) and progress[order[i]] == entity.progress:
+            if entities[order[i]] is entity and i not in group.removed:
+                return group, i
+            i += 1
+        return None, None
+
+    def remove(self, entity):
+        group, i = self.locate(entity)
+        if group is None:
+            return
+        group.removed.add(i)
+        for view in group.views.values():
+            view.set(i, NO_VALUE)
+
+    def update_health(self, entity):
+        # 敌人在本帧内受到伤害后调用，更新已读出的血量和已建立的血量视图
+        if self.health is None:
+            return
+        group, i = self.locate(entity)
+        if group is None:
+            return
+        health = entity.health
+        slot = group.order[i]
+        self.health[slot] = health
+        hidden = self.hidden[slot]
+        for (strategy, include_hidden), view in group.views.items():
+            if include_hidden or not hidden:
+                view.set(i, health if strategy == 'strongest' else -health)
+
+    def health_view(self, group, strategy, include_hidden):
+        view = group.views.get((strategy, include_hidden))
+        if view is None:
+            if self.health is None:
+                self.health = self.health_of(self.entities)
+            values = list(map(self.health.__getitem__, group.order))
+            if strategy == 'weakest':
+                values = list(map(neg, values))
+            if not include_hidden:
+                for i in compress(range(len(values)), map(self.hidden.__getitem__, group.order)):
+                    values[i] = NO_VALUE
+            for i in group.removed:
+                values[i] = NO_VALUE
+            view = group.views[(strategy, include_hidden)] = HealthView(values)
+        return view
+
+    def select(self, coverage, strategy, include_hidden=False):
+        # coverage 为塔射程覆盖的 (路径ID, 起点距离, 终点距离, 路径总长) 区间
+        # first / last 在每个区间内从一端取第一个可见的敌人，再按到终点的剩余距离比较；
+        # strongest / weakest 在血量视图中查询区间内的最大值，血量相同时取离终点最近的敌人
+        progress = self.progress
+        hidden = self.hidden
+        best = None
+        best_key = None
+        for path_id, low, high, length in coverage:
+            group = self.paths.get(path_id)
+            if group is None:
+                continue
+            order = group.order
+            start = bisect.bisect_left(order, low, key=progress.__getitem__)
+            end = bisect.bisect_right(order, high, key=progress.__getitem__)
+            if start == end:
+                continue
+            if strategy == 'first' or strategy == 'last':
+                removed = group.removed
+                indices = range(end - 1, start - 1, -1) if strategy == 'first' else range(start, end)
+                for i in indices:
+                    slot = order[i]
+                    if (include_hidden or not hidden[slot]) and i not in removed:
+                        remaining = length - progress[slot]
+                        key = -remaining if strategy == 'first' else remaining
+                        if best_key is None or key > best_key:
+                            best = self.entities[slot]
+                            best_key = key
+                        break
+            else:
+                view = self.health_view(group, strategy, include_hidden)
+                i = view.best(start, end)
+                if i is not None:
+                    key = (view.values[i], progress[order[i]] - length)
+                    if best_key is None or key > best_key:
+                        best = self.entities[order[i]]
+                        best_key = key
+        return best
@@ -0,0 +1,149 @@
+import json
+import struct
+from entities import (DEFAULT_TOWER_TYPE, ENEMY_TYPE_NAMES, ENEMY_TYPE_CODES, TOWER_PROTOTYPES,
+                      TARGETING_STRATEGIES)
+
+# 增量同步协议：把引擎状态转换为快照，并生成发给客户端的关键帧或增量帧
+
+PROTOCOL_VERSION = 1
+STATE_FIELDS = ('current_wave', 'lives', 'money', 'score', 'is_running', 'selected_tower')
+ENEMY_FIELDS = ('type', 'x', 'y', 'health', 'max_health', 'stealth', 'frozen', 'poisoned', 'count')
+TOWER_FIELDS = ('type', 'x', 'y', 'level', 'range', 'target', 'strategy')
+
+def snapshot_enemy(enemy):
+    # 集群组的生命值和最大生命值为全部成员的合计
+    count = enemy.count
+    if count > 1:
+        health = enemy.health + (count - 1) * enemy.member_health
+        max_health = enemy.max_health * count
+    else:
+        health = enemy.health
+        max_health = enemy.max_health
+    return (enemy.type, round(enemy.x, 2), round(enemy.y, 2),
+            round(health, 1), round(max_health, 1),
+            enemy.stealth, enemy.frozen, enemy.poisoned, count)
+
+def snapshot_tower(tower):
+    return (tower.type, tower.x, tower.y, tower.level, tower.range, tower.target, tower.strategy)
+
+def snapshot_state(engine):
+    # 快照只包含客户端需要渲染的字段，实体以ID为键、字段元组为值，便于快速比较
+    game_state = engine.state
+    if engine.uses_enemy_arrays():
+        enemies = game_state['enemies'].snapshot_rows()
+    else:
+        enemies = {enemy.id: snapshot_enemy(enemy) for enemy in game_state['enemies']}
+    return {
+        'tick': game_state['tick'],
+        'state': tuple(game_state[field] for field in STATE_FIELDS),
+        'enemies': enemies,
+        'towers': {tower.id: snapshot_tower(tower) for tower in game_state['towers']}
+    }
+
+def diff_entities(old, new, fields):
+    spawned = []
+    changed = []
+    for entity_id, values in new.items():
+        old_values = old.get(entity_id)
+        if old_values is None:
+            entity = dict(zip(fields, values))
+            entity['id'] = entity_id
+            spawned.append(entity)
+        elif old_values != values:
+            entity = {'id': entity_id}
+            for field, old_value, value in zip(fields, old_values, values):
+                if old_value != value:
+                    entity[field] = value
+            changed.append(entity)
+    removed = [entity_id for entity_id in old if entity_id not in new]
+    return {'spawned': spawned, 'removed': removed, 'changed': changed}
+
+def build_frame(base, current):
+    # base 为 None 时生成关键帧，否则生成相对 base 快照的增量帧
+    frame = {
+        'status': 'success',
+        'version': PROTOCOL_VERSION,
+        'tick': current['tick'],
+        'keyframe': base is None
+    }
+    if base is None:
+        frame['state'] = dict(zip(STATE_FIELDS, current['state']))
+        base = {'enemies': {}, 'towers': {}}
+    else:
+        frame['base'] = base['tick']
+        frame['state'] = {field: value for field, old_value, value
+                          in zip(STATE_FIELDS, base['state'], current['state']) if old_value != value}
+    frame['enemies'] = diff_entities(base['enemies'], current['enemies'], ENEMY_FIELDS)
+    frame['towers'] = diff_entities(base['towers'], current['towers'], TOWER_FIELDS)
+    return frame
+
+# 二进制帧：实体按固定长度的记录打包，客户端用类型化数组直接读取，编码开销和字节数都远小于 JSON
+# 布局（小端序，所有段按 4 字节对齐）：
+#   头部    magic 'TDBF'、格式版本 u8、标志 u8（bit0 关键帧）、状态段长度 u16、
+#           帧号 u32、基准帧号 u32、新增或变化的敌人数 u32、删除的敌人数 u32、新增或变化的塔数 u32、删除的塔数 u32
+#   状态段  变化的全局状态字段，UTF-8 JSON，补齐到 4 字节；关键帧另带类型编号表
+#   敌人    每个 16 字节：ID u32、类型 u8、标志 u8（bit0 隐身 bit1 冰冻 bit2 中毒，bit3-7 集群成员数减 1，最多 32）、
+#           血量比例 u16（0-65535）、x f32、y f32
+#   塔      每个 16 字节：ID u32、类型 u8、等级 u8、射程 u8、标志 u8（bit0 有目标，bit1-3 攻击策略）、x u16、y u16、目标ID u32
+#   删除的敌人ID、删除的塔ID，各为 u32 数组
+# 新增和变化的实体都发送完整记录，客户端按ID覆盖
+BINARY_MIMETYPE = 'application/vnd.tower-defense.frame'
+BINARY_FORMAT_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sBBHIIIIII')
+ENEMY_RECORD = struct.Struct('<IBBHff')
+TOWER_RECORD = struct.Struct('<IBBBBHHI')
+TOWER_TYPE_NAMES = tuple(TOWER_PROTOTYPES)
+TOWER_TYPE_CODES = {name: code for code, name in enumerate(TOWER_TYPE_NAMES)}
+STRATEGY_CODES = {name: code for code, name in enumerate(TARGETING_STRATEGIES)}
+
+def upserted(old, new):
+    return [(entity_id, values) for entity_id, values in new.items() if old.get(entity_id) != values]
+
+def pack_enemies(rows):
+    # 每个记录单独打包再拼接，比先展开成一个大参数列表再打包更快
+    # 血量比例量化为 0-65535，超出范围的（治疗溢出、死亡的瞬间）截断
+    codes = ENEMY_TYPE_CODES
+    pack = ENEMY_RECORD.pack
+    return b''.join([pack(entity_id, codes[enemy_type],
+                          stealth | frozen << 1 | poisoned << 2 | (min(count, 32) - 1) << 3,
+                          int(health / max_health * 65535 + 0.5) if 0 <= health <= max_health
+                          else (65535 if health > max_health else 0), x, y)
+                     for entity_id, (enemy_type, x, y, health, max_health, stealth, frozen, poisoned, count)
+                     in rows])
+
+def pack_towers(rows):
+    # 未知类型的塔按箭塔计算，也按箭塔显示
+    codes = TOWER_TYPE_CODES
+    default_code = codes[DEFAULT_TOWER_TYPE]
+    strategy_codes = STRATEGY_CODES
+    pack = TOWER_RECORD.pack
+    return b''.join([pack(entity_id, codes.get(tower_type, default_code), level, tower_range,
+                          (target is not None) | strategy_codes[strategy] << 1, x, y, target or 0)
+                     for entity_id, (tower_type, x, y, level, tower_range, target, strategy) in rows])
+
+def encode_binary_frame(base, current):
+    # 与 build_frame 相同的增量语义：base 为 None 时生成关键帧
+    keyframe = base is None
+    if keyframe:
+        state = dict(zip(STATE_FIELDS, current['state']))
+        state['types'] = {'enemies': ENEMY_TYPE_NAMES, 'towers': TOWER_TYPE_NAMES,
+                          'strategies': TARGETING_STRATEGIES}
+        base = {'tick': 0, 'enemies': {}, 'towers': {}}
+    else:
+        state = {field: value for field, old_value, value
+                 in zip(STATE_FIELDS, base['state'], current['state']) if old_value != value}
+    state_bytes = json.dumps(state, separators=(',', ':')).encode('utf-8') if state else b''
+    state_bytes += b' ' * (-len(state_bytes) % 4)
+
+    old_enemies, enemies = base['enemies'], current['enemies']
+    old_towers, towers = base['towers'], current['towers']
+    enemy_rows = upserted(old_enemies, enemies)
+    tower_rows = upserted(old_towers, towers)
+    removed_enemies = [entity_id for entity_id in old_enemies if entity_id not in enemies]
+    removed_towers = [entity_id for entity_id in old_towers if entity_id not in towers]
+    header = BINARY_HEADER.pack(b'TDBF', BINARY_FORMAT_VERSION, keyframe, len(state_bytes),
+                                current['tick'], base['tick'], len(enemy_rows), len(removed_enemies),
+                                len(tower_rows), len(removed_towers))
+    return b''.join((header, state_bytes, pack_enemies(enemy_rows), pack_towers(tower_rows),
+                     struct.pack('<%dI' % len(removed_enemies), *removed_enemies),
+                     struct.pack('<%dI' % len(removed_towers), *removed_towers)))
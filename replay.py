@@ -0,0 +1,77 @@
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+from engine import replay
+
+# 无界面重放录像：用 /recording 导出的种子和玩家输入全速重新运行一局游戏，
+# 可以快进到指定帧或波次，并对之后的若干帧做性能分析
+#
+#   python replay.py recording.json --verify
+#   python replay.py recording.json --until-wave 30 --profile 600
+
+def summarize(engine):
+    state = engine.state
+    return {
+        'tick': state['tick'],
+        'current_wave': state['current_wave'],
+        'lives': state['lives'],
+        'money': round(state['money'], 2),
+        'score': round(state['score'], 2),
+        'is_running': state['is_running'],
+        'enemies': len(state['enemies']),
+        'towers': len(state['towers'])
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='无界面重放游戏录像')
+    parser.add_argument('recording', help='录像 JSON 文件，- 表示从标准输入读取')
+    parser.add_argument('--until-tick', type=int, help='快进到指定帧后停止')
+    parser.add_argument('--until-wave', type=int, help='快进到指定波次开始后停止')
+    parser.add_argument('--enemy-store', choices=('dict', 'numpy'), help='覆盖录像中的敌人存储模式')
+    parser.add_argument('--verify', action='store_true',
+                        help='重放到录像结束的帧，并检查局面摘要是否与录像一致')
+    parser.add_argument('--profile', type=int, metavar='TICKS', help='快进后继续运行指定帧数并输出性能分析')
+    args = parser.parse_args(argv)
+
+    if args.recording == '-':
+        recording = json.load(sys.stdin)
+    else:
+        with open(args.recording, encoding='utf-8') as f:
+            recording = json.load(f)
+
+    start = time.perf_counter()
+    engine = replay(recording, args.until_tick, args.until_wave, enemy_store_mode=args.enemy_store)
+    elapsed = time.perf_counter() - start
+    report = {
+        'replayed_ticks': engine.state['tick'],
+        'elapsed_s': round(elapsed, 3),
+        'ticks_per_second': round(engine.state['tick'] / elapsed, 1) if elapsed > 0 else None,
+        'state': summarize(engine)
+    }
+
+    if args.verify:
+        if engine.state['tick'] != recording['tick']:
+            report['verified'] = False
+            report['verify_error'] = '游戏在第 %d 帧结束，录像结束于第 %d 帧' % (engine.state['tick'], recording['tick'])
+        else:
+            report['verified'] = engine.state_digest() == recording['digest']
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for _ in range(args.profile):
+            if not engine.step():
+                break
+        profiler.disable()
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+        report['state_after_profile'] = summarize(engine)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.verify and not report['verified']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
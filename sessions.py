@@ -0,0 +1,58 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class SessionManager:
+    # 游戏会话管理：按ID保存独立的游戏实例，超过空闲时间或数量上限时淘汰最久未使用的会话
+    # 会话对象需要提供 last_access 属性和 close() 方法
+    def __init__(self, factory, max_sessions=500, idle_timeout=600):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def values(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    def create(self, **kwargs):
+        game_id = uuid.uuid4().hex
+        session = self.factory(game_id, **kwargs)
+        with self.lock:
+            self._evict_idle()
+            while len(self.sessions) >= self.max_sessions:
+                _, oldest = self.sessions.popitem(last=False)
+                oldest.close()
+            self.sessions[game_id] = session
+        return session
+
+    def get(self, game_id):
+        with self.lock:
+            self._evict_idle()
+            session = self.sessions.get(game_id)
+            if session is not None:
+                session.last_access = time.monotonic()
+                self.sessions.move_to_end(game_id)
+            return session
+
+    def touch(self, session):
+        # 长连接（如事件流）在推送期间保持会话活跃
+        with self.lock:
+            session.last_access = time.monotonic()
+            if session.id in self.sessions:
+                self.sessions.move_to_end(session.id)
+
+    def _evict_idle(self):
+        # 会话按最近访问时间排列，从最旧的开始检查，遇到未超时的即可停止
+        deadline = time.monotonic() - self.idle_timeout
+        while self.sessions:
+            game_id, session = next(iter(self.sessions.items()))
+            if session.last_access > deadline:
+                break
+            del self.sessions[game_id]
+            session.close()
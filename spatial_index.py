@@ -0,0 +1,77 @@
+import math
+
+class SpatialHash:
+    # 均匀网格空间索引：按坐标把实体放进固定大小的格子，查询时只检查附近的格子
+    # 重建时缓存每个实体的坐标和隐身状态，查询期间实体不应移动
+    def __init__(self, cell_size=2, hidden_key='stealth'):
+        self.cell_size = cell_size
+        self.hidden_key = hidden_key
+        self.cells = {}
+
+    def _key(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def rebuild(self, entities, xs=None, ys=None, hidden=None):
+        # 记录实体在原列表中的顺序，用于在距离相同时保持原有的选择结果
+        # 可以直接传入坐标列，避免逐个读取实体字段
+        if xs is None:
+            entities = list(entities)
+            xs = [entity.x for entity in entities]
+            ys = [entity.y for entity in entities]
+            hidden = [getattr(entity, self.hidden_key) for entity in entities]
+        self.cells.clear()
+        cell_size = self.cell_size
+        for order, (entity, x, y, is_hidden) in enumerate(zip(entities, xs, ys, hidden)):
+            key = (int(x // cell_size), int(y // cell_size))
+            bucket = self.cells.get(key)
+            if bucket is None:
+                self.cells[key] = bucket = []
+            bucket.append((order, entity, x, y, is_hidden))
+
+    def remove(self, entity):
+        bucket = self.cells.get(self._key(entity.x, entity.y))
+        if not bucket:
+            return
+        for i, item in enumerate(bucket):
+            if item[1] is entity:
+                del bucket[i]
+                return
+
+    def _candidates(self, x, y, radius):
+        min_cx, min_cy = self._key(x - radius, y - radius)
+        max_cx, max_cy = self._key(x + radius, y + radius)
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    yield from bucket
+
+    def query_radius(self, x, y, radius):
+        # 返回半径内的实体，按原列表顺序排列
+        found = []
+        for order, entity, ex, ey, _ in self._candidates(x, y, radius):
+            dx = ex - x
+            dy = ey - y
+            if math.sqrt(dx * dx + dy * dy) <= radius:
+                found.append((order, entity))
+        found.sort(key=lambda item: item[0])
+        return [entity for _, entity in found]
+
+    def nearest(self, x, y, radius, include_hidden=False):
+        # 返回半径内距离最近的实体；距离相同时取原列表中靠前的实体
+        best = None
+        best_order = None
+        min_distance = float('inf')
+        for order, entity, ex, ey, is_hidden in self._candidates(x, y, radius):
+            if is_hidden and not include_hidden:
+                continue
+            dx = ex - x
+            dy = ey - y
+            distance = math.sqrt(dx * dx + dy * dy)
+            if distance > radius:
+                continue
+            if distance < min_distance or (distance == min_distance and order < best_order):
+                best = entity
+                best_order = order
+                min_distance = distance
+        return best
@@ -0,0 +1,47 @@
+import threading
+import time
+
+class GameTicker:
+    # 服务器端固定步长的模拟循环：每个运行中的游戏一个后台线程
+    # step 在持有 lock 时调用，返回 False 表示游戏结束、循环退出
+    def __init__(self, step, lock, tick_rate=60, max_catch_up=5):
+        self.step = step
+        self.lock = lock
+        self.interval = 1.0 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.dropped = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='game-ticker', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_alive(self):
+        return self.thread.is_alive() and not self.stop_event.is_set()
+
+    def run(self):
+        next_tick = time.monotonic()
+        while not self.stop_event.is_set():
+            # 落后时连续补帧，但每轮最多补 max_catch_up 帧
+            steps = 0
+            while steps < self.max_catch_up and time.monotonic() >= next_tick:
+                with self.lock:
+                    if self.stop_event.is_set():
+                        return
+                    running = self.step()
+                if not running:
+                    self.stop_event.set()
+                    return
+                next_tick += self.interval
+                steps += 1
+
+            # 负载过高追不上时丢弃积压的帧，限制每个游戏占用的CPU
+            now = time.monotonic()
+            if now >= next_tick + self.interval * self.max_catch_up:
+                self.dropped += int((now - next_tick) / self.interval)
+                next_tick = now
+
+            self.stop_event.wait(max(0.0, next_tick - time.monotonic()))
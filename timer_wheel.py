@@ -0,0 +1,37 @@
+class TimerWheel:
+    # 哈希时间轮：定时器按到期帧号对槽数取模放入对应的槽，每帧只检查当前槽
+    # 到期时间超过一圈的定时器留在槽中，等到对应的那一圈再取出
+    # 定时器不支持取消，处理时由调用方根据实体当前状态判断是否已经过期作废
+    def __init__(self, slots=256):
+        self.slots = [[] for _ in range(slots)]
+        self.current_tick = -1
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def schedule(self, due_tick, kind, entity_id):
+        # 不能安排到已经处理过的帧，最早为下一帧
+        if due_tick <= self.current_tick:
+            due_tick = self.current_tick + 1
+        self.slots[due_tick % len(self.slots)].append((due_tick, kind, entity_id))
+        self.size += 1
+
+    def advance(self, tick):
+        # 取出在 tick 到期的定时器，按安排的先后顺序返回 (类型, 实体ID)
+        # 每帧调用一次，帧号必须连续递增
+        self.current_tick = tick
+        index = tick % len(self.slots)
+        slot = self.slots[index]
+        if not slot:
+            return []
+        due = []
+        pending = []
+        for timer in slot:
+            if timer[0] <= tick:
+                due.append((timer[1], timer[2]))
+            else:
+                pending.append(timer)
+        self.slots[index] = pending
+        self.size -= len(due)
+        return due